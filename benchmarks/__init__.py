@@ -0,0 +1,91 @@
+"""
+Benchmarks for the API, run them from the repository root:
+
+    python -m benchmarks                  # every endpoint, JSON report
+    python -m benchmarks.compare a.json b.json
+    python -m benchmarks.favourites
+"""
+import os
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+if SRC_DIR not in sys.path:
+    sys.path.insert(0, SRC_DIR)
+
+
+TEMP_DIR_PREFIX = "bench-"
+
+
+def use_database(url=None):
+    # Tiene que llamarse antes de importar app, que lee DATABASE_URL al cargar
+    if url is None:
+        url = "sqlite:///" + os.path.join(tempfile.mkdtemp(prefix=TEMP_DIR_PREFIX), "bench.db")
+    os.environ["DATABASE_URL"] = url
+    return url
+
+
+def is_throwaway_database(url):
+    # SQLite en memoria o un fichero de un directorio creado por use_database
+    from sqlalchemy.engine import make_url
+    url = make_url(url)
+    if url.get_backend_name() != "sqlite":
+        return False
+    if url.database in (None, "", ":memory:"):
+        return True
+    directory = os.path.dirname(os.path.realpath(url.database))
+    return (
+        os.path.dirname(directory) == os.path.realpath(tempfile.gettempdir())
+        and os.path.basename(directory).startswith(TEMP_DIR_PREFIX)
+    )
+
+
+def check_throwaway_database(url, force=False):
+    # Antes de borrar todas las tablas: sin force solo en una base de datos
+    # de usar y tirar, nunca en la de desarrollo o produccion por error
+    from sqlalchemy.engine import make_url
+    if not force and not is_throwaway_database(url):
+        raise SystemExit(
+            f"Refusing to drop every table of {make_url(url).render_as_string(hide_password=True)}: "
+            "it is not a temporary SQLite database, pass --force to reset it anyway"
+        )
+
+
+def percentile(samples, p):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def summarize(samples):
+    return {
+        "p50_ms": round(percentile(samples, 50) * 1000, 3),
+        "p99_ms": round(percentile(samples, 99) * 1000, 3),
+    }
+
+
+@contextmanager
+def count_statements(engine):
+    from sqlalchemy import event
+    counter = {"statements": 0}
+
+    def before_cursor_execute(*args):
+        counter["statements"] += 1
+
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        yield counter
+    finally:
+        event.remove(engine, "before_cursor_execute", before_cursor_execute)
+
+
+def timed(function, iterations):
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        function()
+        samples.append(time.perf_counter() - start)
+    return samples
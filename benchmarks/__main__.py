@@ -0,0 +1,158 @@
+"""
+Benchmark suite for every API endpoint. Seeds a database, drives each route
+through the Flask test client (and optionally a real gunicorn server) and
+prints a JSON report with throughput and p50/p95/p99 per endpoint.
+
+    python -m benchmarks --users 1000 --catalogue 5000 --favourites 20 --output before.json
+    python -m benchmarks.compare before.json after.json
+"""
+import argparse
+import json
+import os
+import platform
+import socket
+import subprocess
+import sys
+import time
+
+from benchmarks import SRC_DIR, use_database, percentile
+from benchmarks.seed import seed
+
+
+ROOT_DIR = os.path.dirname(SRC_DIR)
+
+
+def stats(samples, elapsed):
+    return {
+        "iterations": len(samples),
+        "requests_per_second": round(len(samples) / elapsed, 1) if elapsed else None,
+        "p50_ms": round(percentile(samples, 50) * 1000, 3),
+        "p95_ms": round(percentile(samples, 95) * 1000, 3),
+        "p99_ms": round(percentile(samples, 99) * 1000, 3),
+    }
+
+
+def run_test_client(app, scenarios, iterations, warmup):
+    client = app.test_client()
+    report = {}
+    for item in scenarios:
+        samples, statuses, queries = [], {}, 0
+        for i in range(warmup + iterations):
+            context = item.setup(client, i) if item.setup else None
+            path, kwargs = item.build(i, context)
+            method = item.name.split(" ", 1)[0].lower()
+            start = time.perf_counter()
+            response = getattr(client, method)(path, **kwargs)
+            response.get_data()
+            elapsed = time.perf_counter() - start
+            if i >= warmup:
+                samples.append(elapsed)
+                statuses[str(response.status_code)] = statuses.get(str(response.status_code), 0) + 1
+                queries = max(queries, int(response.headers.get("X-DB-Queries", 0)))
+        report[item.name] = {**stats(samples, sum(samples)), "statuses": statuses, "db_queries": queries}
+    return report
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def run_gunicorn(scenarios, config, concurrency, duration):
+    # Solo los GET sin setup: se pueden repetir en paralelo sin preparar estado
+    from benchmarks.load import run
+    port = free_port()
+    server = subprocess.Popen(
+        ["gunicorn", "wsgi", "--chdir", SRC_DIR, "--config", config, "--bind", f"127.0.0.1:{port}", "--access-logfile", "/dev/null"],
+        cwd=ROOT_DIR, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        for _ in range(100):
+            try:
+                socket.create_connection(("127.0.0.1", port), timeout=1).close()
+                break
+            except OSError:
+                time.sleep(0.1)
+        report = {}
+        for item in scenarios:
+            if not item.name.startswith("GET ") or item.setup or "(stream)" in item.name:
+                continue
+            paths = [item.build(i, None)[0] for i in range(64)]
+            report[item.name] = run(f"http://127.0.0.1:{port}", paths, concurrency, duration)
+        return report
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], cwd=ROOT_DIR, text=True, stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--database-url", help="defaults to a new SQLite file")
+    parser.add_argument("--force", action="store_true", help="allow seeding a --database-url that is not a temporary SQLite file (drops every table)")
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--catalogue", type=int, default=1000)
+    parser.add_argument("--favourites", type=int, default=20, help="favourites of each kind per user")
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--warmup", type=int, default=20)
+    parser.add_argument("--strict-queries", action="store_true", help="stop when a route runs more SQL statements than its @query_budget")
+    parser.add_argument("--only", help="run only the endpoints whose name contains this text")
+    parser.add_argument("--gunicorn", action="store_true", help="also load test the GET endpoints on a real gunicorn server")
+    parser.add_argument("--gunicorn-config", default=os.path.join(ROOT_DIR, "gunicorn.conf.py"))
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=5)
+    parser.add_argument("--output", help="write the report to this file instead of stdout")
+    args = parser.parse_args()
+
+    database_url = use_database(args.database_url)
+    from app import app
+    from models import db
+    from benchmarks.endpoints import build_scenarios, not_covered
+    if args.strict_queries:
+        # TESTING hace que QueryBudgetExceeded llegue hasta aqui en vez de ser un 500
+        app.config.update(TESTING=True, QUERY_BUDGET_STRICT=True)
+
+    with app.app_context():
+        volumes = seed(db, args.users, args.catalogue, args.favourites, force=args.force)
+    scenarios = build_scenarios(volumes)
+    selected = [item for item in scenarios if not args.only or args.only in item.name]
+
+    report = {
+        "meta": {
+            "git_commit": git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "database": database_url.split(":", 1)[0],
+            "volumes": volumes,
+            "iterations": args.iterations,
+            "warmup": args.warmup,
+        },
+        "not_covered": not_covered(app, scenarios),
+        "test_client": run_test_client(app, selected, args.iterations, args.warmup),
+    }
+    if args.gunicorn:
+        # Datos recién sembrados y sin conexiones abiertas antes de arrancar los workers
+        with app.app_context():
+            seed(db, args.users, args.catalogue, args.favourites, force=args.force)
+            for engine in db.engines.values():
+                engine.dispose()
+        report["meta"]["gunicorn"] = {"config": os.path.relpath(args.gunicorn_config, ROOT_DIR), "concurrency": args.concurrency, "duration": args.duration}
+        report["gunicorn"] = run_gunicorn(selected, args.gunicorn_config, args.concurrency, args.duration)
+
+    output = json.dumps(report, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, "w") as file:
+            file.write(output + "\n")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,92 @@
+"""
+Latency of the in-memory autocomplete index with a large catalogue: build
+time, memory, prefix lookups and incremental updates. With --database it
+also times the same prefixes through the ranked name search (/films?q=) on
+SQLite, with the indexes created by the migrations.
+
+    python -m benchmarks.autocomplete --names 1000000
+"""
+import argparse
+import json
+import random
+import time
+import tracemalloc
+
+from benchmarks import use_database, summarize, timed
+
+
+SYLLABLES = ["an", "ar", "da", "dor", "el", "en", "ha", "ho", "ka", "lu", "ma", "na", "ob", "or", "ra", "sa", "sky", "ta", "th", "wa", "yo", "zu"]
+
+
+def make_names(count, generator):
+    names = set()
+    while len(names) < count:
+        words = [
+            "".join(generator.choice(SYLLABLES) for _ in range(generator.randint(2, 4))).capitalize()
+            for _ in range(generator.randint(1, 3))
+        ]
+        names.add(" ".join(words))
+    return sorted(names)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--names", type=int, default=1000000)
+    parser.add_argument("--iterations", type=int, default=10000)
+    parser.add_argument("--database", action="store_true", help="also time the prefix search on a SQLite copy of the names")
+    args = parser.parse_args()
+
+    use_database()
+    from autocomplete import NameIndex
+    from search import SEARCH_KINDS
+
+    generator = random.Random(0)
+    names = make_names(args.names, generator)
+    kinds = list(SEARCH_KINDS)
+    rows = [(kinds[i % len(kinds)], i + 1, name) for i, name in enumerate(names)]
+    prefixes = [generator.choice(names)[:generator.randint(1, 6)] for _ in range(args.iterations)]
+
+    index = NameIndex(kinds)
+    tracemalloc.start()
+    start = time.perf_counter()
+    index.build(iter(rows), {kind: 0 for kind in kinds})
+    build_seconds = time.perf_counter() - start
+    memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    lookups = iter(prefixes)
+    report = {
+        "names": len(index),
+        "build_seconds": round(build_seconds, 2),
+        "index_memory_mb": round(memory / 2 ** 20, 1),
+        "suggest_limit_10": summarize(timed(lambda: index.suggest(next(lookups), 10), args.iterations)),
+    }
+    lookups = iter(prefixes)
+    report["suggest_limit_10_one_kind"] = summarize(timed(lambda: index.suggest(next(lookups), 10, ["films"]), args.iterations))
+
+    # Actualizaciones como las de los handlers: version + 1 en cada cambio
+    renames = iter(generator.sample(rows, min(1000, len(rows))))
+
+    def rename():
+        kind, item_id, name = next(renames)
+        index.apply(kind, index.versions[kind] + 1, added=[(item_id, name + " II")], removed=[(item_id, name)])
+
+    report["rename"] = summarize(timed(rename, min(1000, len(rows))))
+
+    if args.database:
+        from app import app
+        from models import db, Films
+        from search import search_names
+        from benchmarks.seed import reset_schema
+        with app.test_request_context():
+            reset_schema()
+            db.session.execute(db.insert(Films), [{"id": i + 1, "name": name} for i, name in enumerate(names)])
+            db.session.commit()
+            lookups = iter(prefixes[:1000])
+            report["database_name_search_limit_10"] = summarize(timed(lambda: search_names(Films, next(lookups), 0, 10), 1000))
+
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
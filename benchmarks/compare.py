@@ -0,0 +1,60 @@
+"""
+Compares two reports of `python -m benchmarks` endpoint by endpoint and exits
+with 1 when some p95 got slower than the threshold or some endpoint runs more
+SQL statements than before:
+
+    python -m benchmarks.compare before.json after.json --threshold 10
+"""
+import argparse
+import json
+import sys
+
+
+SECTIONS = ("test_client", "gunicorn")
+
+
+def change(before, after):
+    if not before or after is None:
+        return None
+    return round((after - before) / before * 100, 1)
+
+
+def compare(before, after, threshold):
+    rows, regressions = [], []
+    for section in SECTIONS:
+        for name in sorted(set(before.get(section, {})) & set(after.get(section, {}))):
+            old, new = before[section][name], after[section][name]
+            p95 = change(old["p95_ms"], new["p95_ms"])
+            rows.append((section, name, old["p95_ms"], new["p95_ms"], p95, change(old["requests_per_second"], new["requests_per_second"])))
+            if p95 is not None and p95 > threshold:
+                regressions.append(f"{section} {name}: p95 {p95}% slower")
+            if new.get("db_queries", 0) > old.get("db_queries", new.get("db_queries", 0)):
+                regressions.append(f"{section} {name}: {old['db_queries']} -> {new['db_queries']} SQL statements")
+    return rows, regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("before")
+    parser.add_argument("after")
+    parser.add_argument("--threshold", type=float, default=10, help="allowed p95 slowdown in percent")
+    args = parser.parse_args()
+    with open(args.before) as file:
+        before = json.load(file)
+    with open(args.after) as file:
+        after = json.load(file)
+
+    rows, regressions = compare(before, after, args.threshold)
+    print(f"{'endpoint':<70} {'p95 before':>11} {'p95 after':>10} {'p95 %':>7} {'req/s %':>8}")
+    for section, name, old, new, p95, rps in rows:
+        print(f"{section + ' ' + name:<70} {old:>11} {new:>10} {str(p95):>7} {str(rps):>8}")
+    if regressions:
+        print(f"\n{len(regressions)} regressions (p95 threshold {args.threshold}%):")
+        for name in regressions:
+            print(f"  {name}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,120 @@
+"""
+One scenario per route (method + URL rule) of the API. A scenario builds the
+request for iteration i and may prepare state first with an untimed setup
+request, e.g. creating the row that a DELETE then removes.
+"""
+from collections import namedtuple
+
+
+Scenario = namedtuple("Scenario", ["name", "build", "setup", "status"])
+
+KIND_FIELDS = {"films": "film_id", "planets": "planet_id", "species": "specie_id", "characters": "character_id"}
+
+
+def scenario(name, build, setup=None, status=200):
+    # build(i, context) -> (path, kwargs del test client); setup(client, i) -> context.
+    # status es el codigo que tiene que devolver en cada iteracion
+    return Scenario(name, build, setup, status)
+
+
+def get(path):
+    return lambda i, context: (path(i) if callable(path) else path, {})
+
+
+def created_id(client, path, json):
+    return client.post(path, json=json).get_json()["result"]["id"]
+
+
+def build_scenarios(volumes):
+    users, catalogue = volumes["users"], volumes["catalogue"]
+
+    def user(i):
+        return 1 + i % users
+
+    def item(i):
+        return 1 + i % catalogue
+
+    scenarios = [
+        scenario("GET /", get("/")),
+        scenario("GET /metrics", get("/metrics")),
+        scenario("GET /autocomplete", get(lambda i: f"/autocomplete?q={list(KIND_FIELDS)[i % 4][:2 + i % 5]}")),
+        scenario("GET /search", get(lambda i: f"/search?q=s-{item(i)}&limit=20")),
+        scenario("GET /users", get("/users")),
+        scenario("POST /users", lambda i, context: ("/users", {"json": {"email": f"bench-post-{i}@example.com", "password": "x"}})),
+        scenario("GET /users/<int:id>", get(lambda i: f"/users/{user(i)}")),
+        scenario("PATCH /users/<int:id>", lambda i, context: (f"/users/{user(i)}", {"json": {"password": "y"}})),
+        scenario(
+            "DELETE /users/<int:id>",
+            lambda i, context: (f"/users/{context}", {}),
+            lambda client, i: created_id(client, "/users", {"email": f"bench-delete-{i}@example.com", "password": "x"}),
+        ),
+        scenario("GET /users/<int:id>/favourites", get(lambda i: f"/users/{user(i)}/favourites")),
+        scenario(
+            "GET /users/<int:id>/favourites (304)",
+            lambda i, context: (f"/users/{user(i)}/favourites", {"headers": {"If-None-Match": context}}),
+            lambda client, i: client.get(f"/users/{user(i)}/favourites").headers.get("ETag", ""),
+            status=304,
+        ),
+        scenario(
+            "POST /users/<int:id>/favourites/batch",
+            lambda i, context: (f"/users/{user(i)}/favourites/batch", {"json": [
+                {"op": "add" if n % 2 else "remove", "kind": kind, "id": item(i + n)}
+                for n, kind in enumerate(KIND_FIELDS)
+            ]}),
+        ),
+    ]
+    for kind, field in KIND_FIELDS.items():
+        scenarios += [
+            scenario(f"GET /{kind}", get(f"/{kind}")),
+            scenario(f"GET /{kind} (304)", lambda i, context, kind=kind: (f"/{kind}", {"headers": {"If-None-Match": context}}),
+                     lambda client, i, kind=kind: client.get(f"/{kind}").headers.get("ETag", ""), status=304),
+            scenario(f"GET /{kind} (stream)", get(f"/{kind}?stream=1")),
+            scenario(f"GET /{kind} (search)", get(lambda i, kind=kind: f"/{kind}?q={kind}-{item(i)}&limit=20")),
+            scenario(f"POST /{kind}", lambda i, context, kind=kind: (f"/{kind}", {"json": {"name": f"bench-{kind}-{i}"}})),
+            scenario(f"POST /{kind} (bulk)", lambda i, context, kind=kind: (f"/{kind}", {"json": [f"bench-bulk-{kind}-{i}-{n}" for n in range(100)]})),
+            scenario(f"GET /{kind}/<int:id>", get(lambda i, kind=kind: f"/{kind}/{item(i)}")),
+            scenario(f"PUT /{kind}/<int:id>", lambda i, context, kind=kind: (f"/{kind}/{item(i)}", {"json": {"name": f"bench-put-{kind}-{i}"}})),
+            scenario(
+                f"DELETE /{kind}/<int:id>",
+                lambda i, context, kind=kind: (f"/{kind}/{context}", {}),
+                lambda client, i, kind=kind: created_id(client, f"/{kind}", {"name": f"bench-delete-{kind}-{i}"}),
+            ),
+            scenario(f"GET /users/<int:id>/favourites/{kind}", get(lambda i, kind=kind: f"/users/{user(i)}/favourites/{kind}")),
+            scenario(
+                f"POST /users/<int:id>/favourites/{kind}",
+                lambda i, context, kind=kind, field=field: (f"/users/{user(i)}/favourites/{kind}", {"json": {field: item(i)}}),
+                lambda client, i, kind=kind: client.delete(f"/users/{user(i)}/favourites/{kind}/{item(i)}"),
+                status=201,
+            ),
+            scenario(
+                f"GET /users/<int:id>/favourites/{kind}/<int:{field}>",
+                get(lambda i, kind=kind: f"/users/{user(i)}/favourites/{kind}/{item(i)}"),
+            ),
+            scenario(
+                f"DELETE /users/<int:id>/favourites/{kind}/<int:{field}>",
+                lambda i, context, kind=kind: (f"/users/{user(i)}/favourites/{kind}/{item(i)}", {}),
+                lambda client, i, kind=kind, field=field: client.post(f"/users/{user(i)}/favourites/{kind}", json={field: item(i)}),
+            ),
+            scenario(
+                f"DELETE /users/<int:id>/favourites/{kind}/<int:{field}> (minimal)",
+                lambda i, context, kind=kind: (f"/users/{user(i)}/favourites/{kind}/{item(i)}", {"headers": {"Prefer": "return=minimal"}}),
+                lambda client, i, kind=kind, field=field: client.post(f"/users/{user(i)}/favourites/{kind}", json={field: item(i)}),
+            ),
+        ]
+    return scenarios
+
+
+def route_names(app):
+    # "METHOD /rule" de cada ruta de la API (sin Flask-Admin ni static)
+    names = set()
+    for rule in app.url_map.iter_rules():
+        if rule.endpoint == "static" or rule.rule.startswith("/admin"):
+            continue
+        for method in rule.methods - {"HEAD", "OPTIONS"}:
+            names.add(f"{method} {rule.rule}")
+    return names
+
+
+def not_covered(app, scenarios):
+    covered = {item.name.split(" (")[0] for item in scenarios}
+    return sorted(route_names(app) - covered)
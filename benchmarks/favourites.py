@@ -0,0 +1,70 @@
+"""
+Round trips and latency of GET /users/<id>/favourites, before (one query per
+kind plus the user lookup), after (single query over the (user_id, kind,
+item_id) index) and from the per-user snapshot (one primary-key lookup).
+
+    python -m benchmarks.favourites --users 200 --catalogue 500 --favourites 20
+"""
+import argparse
+import json
+import random
+
+from benchmarks import use_database, count_statements, summarize, timed
+from benchmarks.seed import seed
+
+
+def legacy_user_favourites(db, user_id):
+    # Implementacion anterior: Users.query.get + una consulta por tipo
+    from models import Users, UserFavourites
+    from queries import FAVOURITE_KINDS
+    user = db.session.get(Users, user_id)
+    if not user:
+        return None
+    return {
+        kind: [row.serialize() for row in (
+            db.session.query(item)
+            .join(UserFavourites, UserFavourites.item_id == item.id)
+            .filter(UserFavourites.user_id == user.id, UserFavourites.kind == kind)
+            .all()
+        )]
+        for kind, item in FAVOURITE_KINDS.items()
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--database-url")
+    parser.add_argument("--force", action="store_true", help="allow seeding a --database-url that is not a temporary SQLite file (drops every table)")
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--catalogue", type=int, default=500)
+    parser.add_argument("--favourites", type=int, default=20)
+    parser.add_argument("--iterations", type=int, default=1000)
+    args = parser.parse_args()
+
+    use_database(args.database_url)
+    from app import app
+    from models import db
+    from queries import user_favourites, read_snapshot
+
+    with app.app_context():
+        seed(db, args.users, args.catalogue, args.favourites, force=args.force)
+        implementations = {
+            "before": lambda user_id: legacy_user_favourites(db, user_id),
+            "after": user_favourites,
+            "snapshot": read_snapshot,
+        }
+        report = {}
+        for name, implementation in implementations.items():
+            with count_statements(db.engine) as counter:
+                implementation(1)
+                db.session.expunge_all()
+            samples = timed(
+                lambda: (implementation(random.randint(1, args.users)), db.session.expunge_all()),
+                args.iterations,
+            )
+            report[name] = {"round_trips": counter["statements"], **summarize(samples)}
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""
+HTTP load generator: C keep-alive clients hit the given paths for a fixed
+time against a running server and report throughput and latency percentiles.
+
+    python -m benchmarks.load --url http://127.0.0.1:3000 --concurrency 32 --duration 20 /planets /users/1/favourites
+"""
+import argparse
+import http.client
+import json
+import threading
+import time
+from urllib.parse import urlsplit
+
+from benchmarks import percentile
+
+
+def request(connection, path):
+    connection.request("GET", path)
+    response = connection.getresponse()
+    response.read()
+    if response.getheader("Connection", "").lower() == "close":
+        connection.close()
+    return response.status
+
+
+def client(url, paths, deadline, samples, errors):
+    parts = urlsplit(url)
+    connection = http.client.HTTPConnection(parts.hostname, parts.port or 80, timeout=30)
+    position = 0
+    while time.perf_counter() < deadline:
+        path = paths[position % len(paths)]
+        position += 1
+        start = time.perf_counter()
+        try:
+            try:
+                status = request(connection, path)
+            except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+                # El servidor cerro una conexion keep-alive reutilizada (p. ej.
+                # al reciclar el worker): como cualquier cliente HTTP, un GET
+                # se reintenta una vez con una conexion nueva
+                connection.close()
+                status = request(connection, path)
+        except (OSError, http.client.HTTPException):
+            errors.append("connection")
+            connection.close()
+            continue
+        if status >= 500:
+            errors.append(status)
+        samples.append(time.perf_counter() - start)
+    connection.close()
+
+
+def run(url, paths, concurrency, duration):
+    samples, errors = [], []
+    deadline = time.perf_counter() + duration
+    threads = [threading.Thread(target=client, args=(url, paths, deadline, samples, errors)) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return {
+        "requests": len(samples),
+        "errors": len(errors),
+        "requests_per_second": round(len(samples) / duration, 1),
+        "p50_ms": round(percentile(samples, 50) * 1000, 2) if samples else None,
+        "p95_ms": round(percentile(samples, 95) * 1000, 2) if samples else None,
+        "p99_ms": round(percentile(samples, 99) * 1000, 2) if samples else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--url", default="http://127.0.0.1:3000")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=20)
+    parser.add_argument("paths", nargs="*", default=["/planets", "/characters", "/users/1/favourites"])
+    args = parser.parse_args()
+    print(json.dumps(run(args.url, args.paths, args.concurrency, args.duration), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,47 @@
+"""
+Seeds the benchmark database with configurable volumes
+"""
+import os
+import random
+from benchmarks import SRC_DIR, check_throwaway_database
+
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(SRC_DIR), "migrations")
+
+
+def reset_schema(force=False):
+    # Con las migraciones y no con create_all: asi existen tambien los indices
+    # que no estan en los modelos (los de busqueda por nombre)
+    from flask import current_app
+    from flask_migrate import downgrade, upgrade
+    check_throwaway_database(current_app.config["SQLALCHEMY_DATABASE_URI"], force)
+    downgrade(directory=MIGRATIONS_DIR, revision="base")
+    upgrade(directory=MIGRATIONS_DIR)
+
+
+def seed(db, users=100, catalogue=1000, favourites=20, random_seed=0, force=False):
+    # users usuarios, catalogue filas por tabla de catalogo y hasta
+    # favourites favoritos de cada tipo por usuario. Borra lo que hubiera.
+    from models import Users, UserFavourites
+    from queries import FAVOURITE_KINDS, rebuild_snapshots
+    generator = random.Random(random_seed)
+    reset_schema(force)
+    db.session.execute(db.insert(Users), [
+        {"id": i, "email": f"user{i}@example.com", "password": "x", "is_active": True}
+        for i in range(1, users + 1)
+    ])
+    for kind, item in FAVOURITE_KINDS.items():
+        db.session.execute(db.insert(item), [
+            {"id": i, "name": f"{kind}-{i}"} for i in range(1, catalogue + 1)
+        ])
+        rows = [
+            {"user_id": user_id, "kind": kind, "item_id": item_id}
+            for user_id in range(1, users + 1)
+            for item_id in generator.sample(range(1, catalogue + 1), min(favourites, catalogue))
+        ]
+        if rows:
+            db.session.execute(db.insert(UserFavourites), rows)
+    # La copia de favoritos que lee GET /users/<id>/favourites
+    rebuild_snapshots()
+    db.session.commit()
+    return {"users": users, "catalogue": catalogue, "favourites": favourites}
@@ -0,0 +1,76 @@
+"""
+Rows per second for the /characters list: ORM entities + serialize() + the
+stdlib JSON provider, against column rows + the generated row serializer +
+the orjson provider (when orjson is installed).
+
+    python -m benchmarks.serializers --rows 50000
+"""
+import argparse
+import json
+import time
+
+from benchmarks import use_database, check_throwaway_database
+
+
+def seed(db, rows, force=False):
+    from flask import current_app
+    from models import Characters
+    check_throwaway_database(current_app.config["SQLALCHEMY_DATABASE_URI"], force)
+    db.drop_all()
+    db.create_all()
+    db.session.execute(db.insert(Characters), [{"id": i, "name": f"character-{i}"} for i in range(1, rows + 1)])
+    db.session.commit()
+
+
+def rows_per_second(function, rows, iterations):
+    best = None
+    for _ in range(iterations):
+        start = time.perf_counter()
+        function()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return round(rows / best)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--database-url")
+    parser.add_argument("--force", action="store_true", help="allow seeding a --database-url that is not a temporary SQLite file (drops every table)")
+    parser.add_argument("--rows", type=int, default=50000)
+    parser.add_argument("--iterations", type=int, default=5)
+    args = parser.parse_args()
+
+    use_database(args.database_url)
+    from flask.json.provider import DefaultJSONProvider
+    from app import app
+    from models import db, Characters, row_serializer, serialize_select
+    from json_provider import FastJSONProvider, orjson
+
+    default_provider = DefaultJSONProvider(app)
+    fast_provider = FastJSONProvider(app)
+    serialize_row = row_serializer(Characters)
+
+    def orm_path():
+        characters = db.session.execute(db.select(Characters)).scalars()
+        body = {"message": "Characters List", "results": [row.serialize() for row in characters]}
+        default_provider.response(body).get_data()
+        db.session.expunge_all()
+
+    def row_path():
+        characters = db.session.execute(serialize_select(Characters))
+        body = {"message": "Characters List", "results": [serialize_row(row) for row in characters]}
+        fast_provider.response(body).get_data()
+
+    with app.test_request_context():
+        seed(db, args.rows, force=args.force)
+        report = {
+            "rows": args.rows,
+            "orjson": orjson is not None,
+            "orm_serialize_stdlib_json": rows_per_second(orm_path, args.rows, args.iterations),
+            "row_serializer_fast_json": rows_per_second(row_path, args.rows, args.iterations),
+        }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
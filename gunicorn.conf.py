@@ -0,0 +1,74 @@
+# Gunicorn configuration for serving src/wsgi.py in production:
+#   gunicorn wsgi --chdir ./src/ --config gunicorn.conf.py
+# Every value can be overridden with the environment variables below.
+import os
+import sys
+
+
+def _env_int(name, default):
+    return int(os.getenv(name, default))
+
+
+def _available_cpus():
+    # CPUs que puede usar este proceso (cgroups / affinity), no los del host
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+bind = os.getenv("GUNICORN_BIND", f"0.0.0.0:{os.getenv('PORT', '3000')}")
+
+# 2 * CPUs + 1 workers (WEB_CONCURRENCY es el nombre que usan Render y
+# Heroku), con un tope para no agotar la memoria ni las conexiones a la base
+# de datos: cada worker abre hasta DB_POOL_SIZE + DB_MAX_OVERFLOW
+workers = _env_int("WEB_CONCURRENCY", min(2 * _available_cpus() + 1, _env_int("GUNICORN_MAX_WORKERS", 8)))
+# Con threads > 1 el worker es gthread: las peticiones que esperan a una base
+# de datos remota no bloquean el proceso entero. Con SQLite no hay espera de
+# red, el trabajo es CPU y mas threads solo compiten por el GIL.
+_remote_database = os.getenv("DATABASE_URL", "sqlite").split(":", 1)[0] not in ("sqlite", "sqlite+pysqlite")
+threads = _env_int("GUNICORN_THREADS", 4 if _remote_database else 1)
+worker_class = os.getenv("GUNICORN_WORKER_CLASS", "gthread" if threads > 1 else "sync")
+
+# Carga la app una vez en el master y los workers la heredan al hacer fork
+# (arranque mas rapido y memoria compartida). Las conexiones heredadas se
+# descartan en post_fork.
+preload_app = os.getenv("GUNICORN_PRELOAD", "1").lower() in ("1", "true", "yes")
+
+keepalive = _env_int("GUNICORN_KEEPALIVE", 5)
+backlog = _env_int("GUNICORN_BACKLOG", 2048)
+timeout = _env_int("GUNICORN_TIMEOUT", 30)
+graceful_timeout = _env_int("GUNICORN_GRACEFUL_TIMEOUT", 30)
+
+# Recicla cada worker tras max_requests (+ jitter aleatorio, para que no se
+# reinicien todos a la vez) y acota asi cualquier fuga de memoria
+max_requests = _env_int("GUNICORN_MAX_REQUESTS", 1000)
+max_requests_jitter = _env_int("GUNICORN_MAX_REQUESTS_JITTER", 100)
+
+accesslog = os.getenv("GUNICORN_ACCESSLOG", "-")
+
+# Metricas de Prometheus compartidas entre workers (src/metrics.py). Se limpia
+# al cargar la configuracion, antes de que preload_app importe la app: los
+# ficheros de una ejecucion anterior sumarian valores viejos.
+_metrics_dir = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+if _metrics_dir:
+    os.makedirs(_metrics_dir, exist_ok=True)
+    for _name in os.listdir(_metrics_dir):
+        if _name.endswith(".db"):
+            os.remove(os.path.join(_metrics_dir, _name))
+
+
+def post_fork(server, worker):
+    # Con preload_app el pool del engine se creo en el master: el worker no
+    # puede compartir esas conexiones, abre las suyas
+    if "app" in sys.modules and "database" in sys.modules:
+        sys.modules["database"].dispose_engines(sys.modules["app"].app)
+
+
+def child_exit(server, worker):
+    # Quita de los gauges "live" los valores del worker que ha terminado
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        try:
+            from prometheus_client import multiprocess
+        except ImportError:
+            return
+        multiprocess.mark_process_dead(worker.pid)
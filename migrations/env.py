@@ -13,7 +13,9 @@ config = context.config
 
 # Interpret the config file for Python logging.
 # This line sets up loggers basically.
-fileConfig(config.config_file_name)
+# Sin desactivar los loggers ya creados: las migraciones tambien se ejecutan
+# dentro de la app (benchmarks y tests) y sus avisos se perderian
+fileConfig(config.config_file_name, disable_existing_loggers=False)
 logger = logging.getLogger('alembic.env')
 
 # add your model's MetaData object here
@@ -38,6 +40,15 @@ def get_metadata():
     return target_db.metadata
 
 
+def include_object(object, name, type_, reflected, compare_to):
+    # Los indices de busqueda (tablas FTS5 de SQLite y sus tablas internas,
+    # indices pg_trgm y de lower(name)) se crean a mano en una migracion y no
+    # estan en los modelos: autogenerate no debe proponer borrarlos
+    if reflected and compare_to is None and name and ("_name_fts" in name or name.endswith(("_name_trgm", "_name_lower"))):
+        return False
+    return True
+
+
 def run_migrations_offline():
     """Run migrations in 'offline' mode.
 
@@ -52,7 +63,8 @@ def run_migrations_offline():
     """
     url = config.get_main_option("sqlalchemy.url")
     context.configure(
-        url=url, target_metadata=get_metadata(), literal_binds=True
+        url=url, target_metadata=get_metadata(), literal_binds=True,
+        include_object=include_object
     )
 
     with context.begin_transaction():
@@ -84,6 +96,7 @@ def run_migrations_online():
             connection=connection,
             target_metadata=get_metadata(),
             process_revision_directives=process_revision_directives,
+            include_object=include_object,
             **current_app.extensions['migrate'].configure_args
         )
 
@@ -0,0 +1,59 @@
+"""favourites snapshots read model
+
+Revision ID: 3d7f1a2b9c4e
+Revises: 69c90e571c1b
+Create Date: 2026-10-18 16:42:31.204517
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3d7f1a2b9c4e'
+down_revision = '69c90e571c1b'
+branch_labels = None
+depends_on = None
+
+
+# Tipo -> (tabla de favoritos, columna con el id, tabla del catalogo), como
+# FAVOURITE_KINDS en src/queries.py en esta revision
+FAVOURITE_TABLES = {
+    'characters': ('favourites_characters', 'character_id', 'characters'),
+    'species': ('favourites_species', 'specie_id', 'species'),
+    'planets': ('favourites_planets', 'planet_id', 'planets'),
+    'films': ('favourites_films', 'film_id', 'films'),
+}
+CHUNK_SIZE = 500
+
+
+def upgrade():
+    snapshots = op.create_table('favourites_snapshots',
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('favourites', sa.JSON(), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('user_id')
+    )
+
+    # Copia inicial de todos los usuarios, con el mismo orden que la API
+    bind = op.get_bind()
+    favourites = {
+        user_id: {kind: [] for kind in FAVOURITE_TABLES}
+        for user_id in bind.execute(sa.text('SELECT id FROM users')).scalars()
+    }
+    union = ' UNION ALL '.join(
+        f"SELECT '{kind}' AS kind, f.id AS favourite_id, f.user_id, i.id, i.name "
+        f"FROM {favourite} f JOIN {item} i ON f.{column} = i.id"
+        for kind, (favourite, column, item) in FAVOURITE_TABLES.items()
+    )
+    rows = bind.execute(sa.text(f'SELECT user_id, kind, id, name FROM ({union}) AS favourites ORDER BY user_id, kind, favourite_id'))
+    for row in rows:
+        if row.user_id in favourites:
+            favourites[row.user_id][row.kind].append({'id': row.id, 'name': row.name})
+    values = [{'user_id': user_id, 'favourites': items} for user_id, items in favourites.items()]
+    for start in range(0, len(values), CHUNK_SIZE):
+        op.bulk_insert(snapshots, values[start:start + CHUNK_SIZE])
+
+
+def downgrade():
+    op.drop_table('favourites_snapshots')
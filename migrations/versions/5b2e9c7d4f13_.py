@@ -0,0 +1,34 @@
+"""case-insensitive name prefix indexes
+
+Revision ID: 5b2e9c7d4f13
+Revises: 8e4c2d61a5f0
+Create Date: 2026-10-18 21:14:36.402517
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5b2e9c7d4f13'
+down_revision = '8e4c2d61a5f0'
+branch_labels = None
+depends_on = None
+
+
+CATALOGUE_TABLES = ['planets', 'films', 'characters', 'species']
+
+
+def upgrade():
+    # Indice sobre lower(name) para las busquedas cortas por prefijo sin
+    # distinguir mayusculas. En PostgreSQL con text_pattern_ops: LIKE 'ho%'
+    # lo usa sea cual sea la collation de la base de datos
+    bind = op.get_bind()
+    opclass = ' text_pattern_ops' if bind.dialect.name == 'postgresql' else ''
+    for table in CATALOGUE_TABLES:
+        op.execute(f'CREATE INDEX ix_{table}_name_lower ON {table} (lower(name){opclass})')
+
+
+def downgrade():
+    for table in reversed(CATALOGUE_TABLES):
+        op.execute(f'DROP INDEX IF EXISTS ix_{table}_name_lower')
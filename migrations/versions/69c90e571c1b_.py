@@ -0,0 +1,66 @@
+"""catalogue name search indexes
+
+Revision ID: 69c90e571c1b
+Revises: 930124b1747e
+Create Date: 2026-10-18 13:05:12.582140
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '69c90e571c1b'
+down_revision = '930124b1747e'
+branch_labels = None
+depends_on = None
+
+
+CATALOGUE_TABLES = ['planets', 'films', 'characters', 'species']
+
+
+def sqlite_has_trigram(bind):
+    # El tokenizer trigram de FTS5 existe desde SQLite 3.34
+    version = tuple(int(part) for part in bind.exec_driver_sql('SELECT sqlite_version()').scalar().split('.'))
+    return version >= (3, 34, 0)
+
+
+def upgrade():
+    bind = op.get_bind()
+    if bind.dialect.name == 'postgresql':
+        op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+        for table in CATALOGUE_TABLES:
+            op.execute(f'CREATE INDEX ix_{table}_name_trgm ON {table} USING gin (name gin_trgm_ops)')
+    elif bind.dialect.name == 'sqlite' and sqlite_has_trigram(bind):
+        # Tabla FTS5 con el contenido en la tabla original (content=), los
+        # triggers la mantienen al dia y 'rebuild' indexa las filas existentes
+        for table in CATALOGUE_TABLES:
+            fts = f'{table}_name_fts'
+            op.execute(f"CREATE VIRTUAL TABLE {fts} USING fts5(name, content='{table}', content_rowid='id', tokenize='trigram')")
+            op.execute(f"INSERT INTO {fts}({fts}) VALUES ('rebuild')")
+            op.execute(
+                f'CREATE TRIGGER {fts}_insert AFTER INSERT ON {table} BEGIN '
+                f'INSERT INTO {fts}(rowid, name) VALUES (new.id, new.name); END'
+            )
+            op.execute(
+                f'CREATE TRIGGER {fts}_delete AFTER DELETE ON {table} BEGIN '
+                f"INSERT INTO {fts}({fts}, rowid, name) VALUES ('delete', old.id, old.name); END"
+            )
+            op.execute(
+                f'CREATE TRIGGER {fts}_update AFTER UPDATE OF name ON {table} BEGIN '
+                f"INSERT INTO {fts}({fts}, rowid, name) VALUES ('delete', old.id, old.name); "
+                f'INSERT INTO {fts}(rowid, name) VALUES (new.id, new.name); END'
+            )
+
+
+def downgrade():
+    bind = op.get_bind()
+    if bind.dialect.name == 'postgresql':
+        for table in reversed(CATALOGUE_TABLES):
+            op.execute(f'DROP INDEX IF EXISTS ix_{table}_name_trgm')
+    elif bind.dialect.name == 'sqlite':
+        for table in reversed(CATALOGUE_TABLES):
+            fts = f'{table}_name_fts'
+            for trigger in ('insert', 'delete', 'update'):
+                op.execute(f'DROP TRIGGER IF EXISTS {fts}_{trigger}')
+            op.execute(f'DROP TABLE IF EXISTS {fts}')
@@ -0,0 +1,144 @@
+"""unified user favourites table
+
+Revision ID: 8e4c2d61a5f0
+Revises: 3d7f1a2b9c4e
+Create Date: 2026-10-18 18:20:47.913268
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8e4c2d61a5f0'
+down_revision = '3d7f1a2b9c4e'
+branch_labels = None
+depends_on = None
+
+
+# Tipo -> (tabla de favoritos anterior, columna con el id, tabla del catalogo)
+FAVOURITE_TABLES = {
+    'characters': ('favourites_characters', 'character_id', 'characters'),
+    'species': ('favourites_species', 'specie_id', 'species'),
+    'planets': ('favourites_planets', 'planet_id', 'planets'),
+    'films': ('favourites_films', 'film_id', 'films'),
+}
+CHUNK_SIZE = 500
+
+
+def refresh_snapshots(bind, user_ids):
+    # Rehace desde user_favourites la copia de favoritos de esos usuarios, con
+    # el mismo orden que la API (tipo y despues id), y cambia su ETag
+    snapshots = sa.table('favourites_snapshots', sa.column('user_id', sa.Integer), sa.column('favourites', sa.JSON))
+    user_ids = sorted(user_ids)
+    for start in range(0, len(user_ids), CHUNK_SIZE):
+        chunk = user_ids[start:start + CHUNK_SIZE]
+        favourites = {user_id: {kind: [] for kind in FAVOURITE_TABLES} for user_id in chunk}
+        union = ' UNION ALL '.join(
+            f"SELECT uf.id AS favourite_id, uf.user_id, uf.kind, i.id, i.name FROM user_favourites uf "
+            f"JOIN {item} i ON uf.kind = '{kind}' AND i.id = uf.item_id"
+            for kind, (table, column, item) in FAVOURITE_TABLES.items()
+        )
+        rows = bind.execute(
+            sa.text(f'SELECT user_id, kind, id, name FROM ({union}) AS favourites WHERE user_id IN :user_ids ORDER BY user_id, kind, favourite_id')
+            .bindparams(sa.bindparam('user_ids', expanding=True)),
+            {'user_ids': chunk},
+        )
+        for row in rows:
+            favourites[row.user_id][row.kind].append({'id': row.id, 'name': row.name})
+        bind.execute(snapshots.delete().where(snapshots.c.user_id.in_(chunk)))
+        op.bulk_insert(snapshots, [{'user_id': user_id, 'favourites': items} for user_id, items in favourites.items()])
+        # Nueva version de sus favoritos para que los ETag anteriores no
+        # respondan 304 (sin fila la version es 0, se crea con 1)
+        keys = [f'favourites:{user_id}' for user_id in chunk]
+        versions = sa.table('resource_versions', sa.column('key', sa.String), sa.column('version', sa.Integer))
+        bind.execute(versions.update().where(versions.c.key.in_(keys)).values(version=versions.c.version + 1))
+        existing = set(bind.execute(sa.select(versions.c.key).where(versions.c.key.in_(keys))).scalars())
+        missing = [{'key': key, 'version': 1} for key in keys if key not in existing]
+        if missing:
+            op.bulk_insert(versions, missing)
+
+
+def upgrade():
+    op.create_table('user_favourites',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('kind', sa.String(length=16), nullable=False),
+    sa.Column('item_id', sa.Integer(), nullable=False),
+    sa.CheckConstraint("kind IN ('characters', 'species', 'planets', 'films')", name='ck_user_favourites_kind'),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_user_favourites_user_id_kind_item_id', 'user_favourites', ['user_id', 'kind', 'item_id'], unique=True, postgresql_include=['id'])
+    op.create_index('ix_user_favourites_kind_item_id', 'user_favourites', ['kind', 'item_id'], unique=False)
+
+    # Se copian en el orden de insercion (el id nuevo mantiene el orden de
+    # cada tipo) y solo las filas cuyo usuario e item existen
+    for kind, (table, column, item) in FAVOURITE_TABLES.items():
+        op.execute(
+            f"INSERT INTO user_favourites (user_id, kind, item_id) "
+            f"SELECT f.user_id, '{kind}', f.{column} FROM {table} f "
+            f"JOIN users u ON u.id = f.user_id JOIN {item} i ON i.id = f.{column} "
+            f"ORDER BY f.id"
+        )
+    # La tabla ancha favourites (una columna por tipo) no la usaba la API,
+    # pero se copian sus filas que no esten ya. La copia de favoritos de
+    # 3d7f1a2b9c4e no las tiene: se rehace la de los usuarios que reciben alguna
+    bind = op.get_bind()
+    affected = set()
+    for kind, (table, column, item) in FAVOURITE_TABLES.items():
+        affected.update(bind.execute(sa.text(
+            f"SELECT DISTINCT f.user_id FROM favourites f "
+            f"JOIN users u ON u.id = f.user_id JOIN {item} i ON i.id = f.{column} "
+            f"WHERE NOT EXISTS (SELECT 1 FROM user_favourites uf "
+            f"WHERE uf.user_id = f.user_id AND uf.kind = '{kind}' AND uf.item_id = f.{column})"
+        )).scalars())
+        op.execute(
+            f"INSERT INTO user_favourites (user_id, kind, item_id) "
+            f"SELECT f.user_id, '{kind}', f.{column} FROM favourites f "
+            f"JOIN users u ON u.id = f.user_id JOIN {item} i ON i.id = f.{column} "
+            f"WHERE NOT EXISTS (SELECT 1 FROM user_favourites uf "
+            f"WHERE uf.user_id = f.user_id AND uf.kind = '{kind}' AND uf.item_id = f.{column}) "
+            f"GROUP BY f.user_id, f.{column} ORDER BY MIN(f.id)"
+        )
+    refresh_snapshots(bind, affected)
+
+    op.drop_table('favourites')
+    for kind, (table, column, item) in FAVOURITE_TABLES.items():
+        op.drop_table(table)
+
+
+def downgrade():
+    op.create_table('favourites',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=True),
+    sa.Column('film_id', sa.Integer(), nullable=True),
+    sa.Column('planet_id', sa.Integer(), nullable=True),
+    sa.Column('specie_id', sa.Integer(), nullable=True),
+    sa.Column('character_id', sa.Integer(), nullable=True),
+    sa.ForeignKeyConstraint(['character_id'], ['characters.id'], ),
+    sa.ForeignKeyConstraint(['film_id'], ['films.id'], ),
+    sa.ForeignKeyConstraint(['planet_id'], ['planets.id'], ),
+    sa.ForeignKeyConstraint(['specie_id'], ['species.id'], ),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    for kind, (table, column, item) in FAVOURITE_TABLES.items():
+        op.create_table(table,
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=True),
+        sa.Column(column, sa.Integer(), nullable=True),
+        sa.ForeignKeyConstraint([column], [f'{item}.id'], ),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+        sa.PrimaryKeyConstraint('id')
+        )
+        op.create_index(f'ix_{table}_user_id_{column}', table, ['user_id', column], unique=True)
+        op.create_index(f'ix_{table}_{column}', table, [column], unique=False)
+        op.execute(
+            f"INSERT INTO {table} (user_id, {column}) "
+            f"SELECT user_id, item_id FROM user_favourites WHERE kind = '{kind}' ORDER BY id"
+        )
+
+    op.drop_index('ix_user_favourites_kind_item_id', table_name='user_favourites')
+    op.drop_index('ix_user_favourites_user_id_kind_item_id', table_name='user_favourites')
+    op.drop_table('user_favourites')
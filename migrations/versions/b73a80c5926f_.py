@@ -0,0 +1,41 @@
+"""favourites indexes
+
+Revision ID: b73a80c5926f
+Revises: 459812cc72aa
+Create Date: 2026-10-18 10:12:31.402113
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b73a80c5926f'
+down_revision = '459812cc72aa'
+branch_labels = None
+depends_on = None
+
+
+FAVOURITES_TABLES = [
+    ('favourites_films', 'film_id'),
+    ('favourites_planets', 'planet_id'),
+    ('favourites_characters', 'character_id'),
+    ('favourites_species', 'specie_id'),
+]
+
+
+def upgrade():
+    for table, column in FAVOURITES_TABLES:
+        # Borrar duplicados antes de crear el indice unico, se queda el mas antiguo
+        op.execute(
+            f'DELETE FROM {table} WHERE id NOT IN ('
+            f'SELECT keep_id FROM (SELECT MIN(id) AS keep_id FROM {table} GROUP BY user_id, {column}) AS keep)'
+        )
+        op.create_index(f'ix_{table}_user_id_{column}', table, ['user_id', column], unique=True)
+        op.create_index(f'ix_{table}_{column}', table, [column], unique=False)
+
+
+def downgrade():
+    for table, column in reversed(FAVOURITES_TABLES):
+        op.drop_index(f'ix_{table}_{column}', table_name=table)
+        op.drop_index(f'ix_{table}_user_id_{column}', table_name=table)
@@ -1,23 +1,145 @@
 import os
-from flask_admin import Admin
+import hmac
+from flask import request, redirect, Response, g
+from flask_admin import Admin, BaseView, expose
 from flask_admin.contrib.sqla import ModelView
-from models import db, Users, Films, Characters, Planets, Species, FavouritesFilms, FavouritesPlanets, FavouritesCharacters, FavouritesSpecies, Favourites
+from sqlalchemy import inspect
+from models import db, Users, Films, Characters, Planets, Species, UserFavourites
+from queries import favourites_key, bump_versions, create_snapshot, delete_user_favourites, refresh_item_snapshots, refresh_snapshots, snapshot_remove, invalidate_catalogue
+from autocomplete import record_change
+from profiler import profiler, PROFILE_SAMPLE_RATE, PROFILE_INTERVAL_MS
+from slow_queries import slow_queries, SLOW_QUERY_MS
+
+# Credenciales (HTTP Basic) de las vistas de diagnostico, sin ADMIN_PASSWORD
+# no se pueden abrir
+ADMIN_USERNAME = os.getenv("ADMIN_USERNAME", "admin")
+ADMIN_PASSWORD = os.getenv("ADMIN_PASSWORD")
+
+
+class ProtectedView(BaseView):
+    def is_accessible(self):
+        auth = request.authorization
+        return bool(
+            ADMIN_PASSWORD and auth and auth.type == "basic"
+            and hmac.compare_digest(auth.username or "", ADMIN_USERNAME)
+            and hmac.compare_digest(auth.password or "", ADMIN_PASSWORD)
+        )
+
+    def inaccessible_callback(self, name, **kwargs):
+        return Response("Authentication required", 401, {"WWW-Authenticate": 'Basic realm="admin"'})
+
+
+class ProfilerView(ProtectedView):
+    @expose("/")
+    def index(self):
+        return self.render(
+            "admin/profiler.html",
+            summary=profiler.summary(),
+            enabled=PROFILE_SAMPLE_RATE > 0,
+            sample_rate=PROFILE_SAMPLE_RATE,
+            interval_ms=PROFILE_INTERVAL_MS,
+            pid=os.getpid(),
+        )
+
+    @expose("/collapsed")
+    def collapsed(self):
+        # Formato de flamegraph.pl / speedscope / inferno
+        return Response(profiler.collapsed(request.args.get("route")), mimetype="text/plain")
+
+    @expose("/reset", methods=["POST"])
+    def reset(self):
+        profiler.reset()
+        return redirect(self.get_url(".index"))
+
+
+class SlowQueriesView(ProtectedView):
+    @expose("/")
+    def index(self):
+        return self.render(
+            "admin/slow_queries.html",
+            entries=list(reversed(slow_queries)),
+            enabled=SLOW_QUERY_MS > 0,
+            threshold_ms=SLOW_QUERY_MS,
+            size=slow_queries.maxlen,
+            pid=os.getpid(),
+        )
+
+    @expose("/reset", methods=["POST"])
+    def reset(self):
+        slow_queries.clear()
+        return redirect(self.get_url(".index"))
+
+
+# Las vistas de modelos hacen lo mismo que los handlers de escritura de la
+# API: on_model_change/on_model_delete corren antes del commit de Flask-Admin
+# (copias de favoritos y versiones en la misma transaccion) y
+# after_model_change/after_model_delete despues (cache del catalogo e indice
+# de autocompletado).
+class UsersView(ModelView):
+    def on_model_change(self, form, model, is_created):
+        if is_created:
+            db.session.flush()
+            create_snapshot(model.id)
+            bump_versions(Users.__tablename__, favourites_key(model.id))
+        else:
+            bump_versions(Users.__tablename__)
+
+    def on_model_delete(self, model):
+        delete_user_favourites(model.id)
+        bump_versions(Users.__tablename__, favourites_key(model.id))
+
+
+class CatalogueView(ModelView):
+    def on_model_change(self, form, model, is_created):
+        # Nombre anterior (vacio si no ha cambiado) para el autocompletado
+        g.admin_removed = [(model.id, name) for name in inspect(model).attrs.name.history.deleted]
+        db.session.flush()
+        if not is_created:
+            refresh_item_snapshots(type(model), model.id)
+        bump_versions(model.__tablename__)
+
+    def after_model_change(self, form, model, is_created):
+        invalidate_catalogue(type(model))
+        removed = g.pop("admin_removed", [])
+        if is_created or removed:
+            record_change(type(model), added=[(model.id, model.name)], removed=removed)
+
+    def on_model_delete(self, model):
+        refresh_item_snapshots(type(model), model.id, deleted=True)
+        bump_versions(model.__tablename__)
+
+    def after_model_delete(self, model):
+        invalidate_catalogue(type(model))
+        record_change(type(model), removed=[(model.id, model.name)])
+
+
+class UserFavouritesView(ModelView):
+    def on_model_change(self, form, model, is_created):
+        # Si se cambia de usuario hay que rehacer tambien la copia del anterior
+        history = inspect(model).attrs.user_id.history
+        user_ids = {model.user_id, *history.deleted}
+        db.session.flush()
+        refresh_snapshots(user_ids)
+        bump_versions(*[favourites_key(user_id) for user_id in user_ids])
+
+    def on_model_delete(self, model):
+        snapshot_remove(model.user_id, model.kind, [model.item_id])
+        bump_versions(favourites_key(model.user_id))
+
 
 def setup_admin(app):
     app.secret_key = os.environ.get('FLASK_APP_KEY', 'sample key')
     app.config['FLASK_ADMIN_SWATCH'] = 'cerulean'
     admin = Admin(app, name='4Geeks Admin', template_mode='bootstrap3')    
     # Add your models here, for example this is how we add a the User model to the admin
-    admin.add_view(ModelView(Users, db.session))
-    admin.add_view(ModelView(Films, db.session))
-    admin.add_view(ModelView(Characters, db.session))
-    admin.add_view(ModelView(Planets, db.session))
-    admin.add_view(ModelView(Species, db.session))
-    admin.add_view(ModelView(FavouritesFilms, db.session))
-    admin.add_view(ModelView(FavouritesPlanets, db.session))
-    admin.add_view(ModelView(FavouritesCharacters, db.session))
-    admin.add_view(ModelView(FavouritesSpecies, db.session))
-    admin.add_view(ModelView(Favourites, db.session))
+    admin.add_view(UsersView(Users, db.session))
+    admin.add_view(CatalogueView(Films, db.session))
+    admin.add_view(CatalogueView(Characters, db.session))
+    admin.add_view(CatalogueView(Planets, db.session))
+    admin.add_view(CatalogueView(Species, db.session))
+    admin.add_view(UserFavouritesView(UserFavourites, db.session))
+    admin.add_view(ProfilerView(name="Profiler", endpoint="profiler", category="Diagnostics"))
+    admin.add_view(SlowQueriesView(name="Slow queries", endpoint="slow_queries", url="slow-queries", category="Diagnostics"))
 
    
 
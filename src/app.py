@@ -6,14 +6,28 @@ from flask import Flask, request, jsonify, url_for
 from flask_migrate import Migrate
 from flask_swagger import swagger
 from flask_cors import CORS
-from utils import APIException, generate_sitemap
+from utils import APIException, Int64Converter, generate_sitemap, get_page_args, get_search_args, get_int_arg, read_json_items, wants_stream, wants_minimal, prefer_return, stream_response, MAX_BATCH_SIZE
 from admin import setup_admin
-from models import db, Users, Films, Characters, Species, Planets, FavouritesFilms, FavouritesPlanets, FavouritesCharacters, FavouritesSpecies, Favourites
+from compression import setup_compression
+from json_provider import FastJSONProvider
+from database import engine_options, setup_engine
+from http_cache import conditional
+from query_stats import setup_query_stats, query_budget
+from metrics import setup_metrics
+from profiler import setup_profiler
+from slow_queries import setup_slow_queries
+from commands import setup_commands
+from search import SEARCH_KINDS, catalogue_search, search_catalogue
+from autocomplete import name_index, refresh_index, record_change, AUTOCOMPLETE_DEFAULT_LIMIT, AUTOCOMPLETE_MAX_LIMIT
+from queries import favourites_key, bump_versions, read_snapshot, create_snapshot, delete_user_favourites, refresh_item_snapshots, keyset_page, catalogue_page, get_catalogue_item, invalidate_catalogue, stream_rows, favourite_items, find_favourite, delete_favourite, user_favourites, insert_favourite, to_item_id, apply_favourites_batch, bulk_insert_names
+from models import db, Users, Films, Characters, Species, Planets, UserFavourites
 
 
 # Istancias de Flask
 app = Flask(__name__)
+app.json = FastJSONProvider(app)
 app.url_map.strict_slashes = False
+app.url_map.converters["int"] = Int64Converter
 # Configuracion de DB
 db_url = os.getenv("DATABASE_URL")
 if db_url is not None:
@@ -21,10 +35,18 @@ if db_url is not None:
 else:
     app.config['SQLALCHEMY_DATABASE_URI'] = "sqlite:////tmp/test.db"
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(app.config['SQLALCHEMY_DATABASE_URI'])
 MIGRATE = Migrate(app, db)
 db.init_app(app)
+setup_engine(app)
+setup_query_stats(app)
+setup_metrics(app)
+setup_profiler(app)
+setup_slow_queries(app)
 CORS(app)
 setup_admin(app)
+setup_compression(app)
+setup_commands(app)
 
 
 # Handle/serialize errors like a JSON object
@@ -35,16 +57,23 @@ def handle_invalid_usage(error):
 
 # Generate sitemap with all your endpoints
 @app.route('/')
+@query_budget(0)
 def sitemap():
     return generate_sitemap(app)
 
 
 @app.route("/users", methods=["GET", "POST"])
+@query_budget(4)
+@conditional(lambda: [Users.__tablename__])
 def handle_users():
     response_body = results = {}
     if request.method == "GET":
-        users = db.session.execute(db.select(Users)).scalars()
-        response_body["results"] = [row.serialize() for row in users]
+        if wants_stream():
+            return stream_response(stream_rows(Users, get_int_arg("after", 0)), "Metodo GET de users")
+        after, limit = get_page_args()
+        users, next_cursor = keyset_page(Users, after, limit)
+        response_body["results"] = users
+        response_body["next_cursor"] = next_cursor
         response_body["message"] = "Metodo GET de users"
         return response_body, 200
     if request.method == "POST":
@@ -54,6 +83,9 @@ def handle_users():
             email = data["email"],
             is_active = True)
         db.session.add(user)
+        db.session.flush()
+        create_snapshot(user.id)
+        bump_versions(Users.__tablename__, favourites_key(user.id))
         db.session.commit()
         response_body["message"] = "Metodo POST de users"
         response_body["result"] = user.serialize()
@@ -61,78 +93,223 @@ def handle_users():
 
 
 @app.route("/planets", methods=["GET", "POST"])
+@query_budget(3)
+@conditional(lambda: [Planets.__tablename__])
 def handle_planets():
     response_body = {}
     if request.method == "GET":
-        planets = db.session.execute(db.select(Planets)).scalars()
+        if "q" in request.args:
+            q, offset, limit = get_search_args()
+            planets, next_offset = catalogue_search(Planets, q, offset, limit)
+            response_body["message"] = "Planets List"
+            response_body["results"] = planets
+            response_body["next_offset"] = next_offset
+            return response_body, 200
+        if wants_stream():
+            return stream_response(stream_rows(Planets, get_int_arg("after", 0)), "Planets List")
+        after, limit = get_page_args()
+        planets, next_cursor = catalogue_page(Planets, after, limit)
         response_body["message"] = "Planets List"
-        response_body["results"] = [row.serialize() for row in planets]
+        response_body["results"] = planets
+        response_body["next_cursor"] = next_cursor
         return response_body, 200
     if request.method == "POST":
+        items = read_json_items()
+        if items is not None:
+            added, skipped = bulk_insert_names(Planets, items)
+            db.session.commit()
+            invalidate_catalogue(Planets)
+            record_change(Planets, added=added)
+            response_body["message"] = "Planets added"
+            response_body["inserted"] = len(added)
+            response_body["skipped"] = skipped
+            return response_body, 200
         data = request.json
         planet = Planets(name = data["name"])
         db.session.add(planet)
+        bump_versions(Planets.__tablename__)
         db.session.commit()
+        invalidate_catalogue(Planets)
+        record_change(Planets, added=[(planet.id, planet.name)])
         response_body["message"] = "Planet added"
         response_body["result"] = planet.serialize()
         return response_body, 200
 
 
 @app.route("/characters", methods=["GET", "POST"])
+@query_budget(3)
+@conditional(lambda: [Characters.__tablename__])
 def handle_characters():
+    response_body = {}
     if request.method == "GET":
-        response_body = {}
-        characters = db.session.execute(db.select(Characters)).scalars()
+        if "q" in request.args:
+            q, offset, limit = get_search_args()
+            characters, next_offset = catalogue_search(Characters, q, offset, limit)
+            response_body["message"] = "Characters List"
+            response_body["results"] = characters
+            response_body["next_offset"] = next_offset
+            return response_body, 200
+        if wants_stream():
+            return stream_response(stream_rows(Characters, get_int_arg("after", 0)), "Characters List")
+        after, limit = get_page_args()
+        characters, next_cursor = catalogue_page(Characters, after, limit)
         response_body["message"] = "Characters List"
-        response_body["results"] = [row.serialize() for row in characters]
+        response_body["results"] = characters
+        response_body["next_cursor"] = next_cursor
         return response_body, 200
     if request.method == "POST":
+        items = read_json_items()
+        if items is not None:
+            added, skipped = bulk_insert_names(Characters, items)
+            db.session.commit()
+            invalidate_catalogue(Characters)
+            record_change(Characters, added=added)
+            response_body["message"] = "Characters added"
+            response_body["inserted"] = len(added)
+            response_body["skipped"] = skipped
+            return response_body, 200
         data = request.json
         character = Characters(name = data["name"])
         db.session.add(character)
+        bump_versions(Characters.__tablename__)
         db.session.commit()
+        invalidate_catalogue(Characters)
+        record_change(Characters, added=[(character.id, character.name)])
         response_body["message"] = "Character added"
         response_body["result"] = character.serialize()
         return response_body, 200
 
 
 @app.route("/films", methods=["GET", "POST"])
+@query_budget(3)
+@conditional(lambda: [Films.__tablename__])
 def handle_films():
     response_body = {}
     if request.method == "GET":
-        films = db.session.execute(db.select(Films)).scalars()
+        if "q" in request.args:
+            q, offset, limit = get_search_args()
+            films, next_offset = catalogue_search(Films, q, offset, limit)
+            response_body["message"] = "Films List"
+            response_body["results"] = films
+            response_body["next_offset"] = next_offset
+            return response_body, 200
+        if wants_stream():
+            return stream_response(stream_rows(Films, get_int_arg("after", 0)), "Films List")
+        after, limit = get_page_args()
+        films, next_cursor = catalogue_page(Films, after, limit)
         response_body["message"] = "Films List"
-        response_body["results"] = [row.serialize() for row in films]
+        response_body["results"] = films
+        response_body["next_cursor"] = next_cursor
         return response_body, 200
     if request.method == "POST":
+        items = read_json_items()
+        if items is not None:
+            added, skipped = bulk_insert_names(Films, items)
+            db.session.commit()
+            invalidate_catalogue(Films)
+            record_change(Films, added=added)
+            response_body["message"] = "Films added"
+            response_body["inserted"] = len(added)
+            response_body["skipped"] = skipped
+            return response_body, 200
         data = request.json
         film = Films(name = data["name"])
         db.session.add(film)
+        bump_versions(Films.__tablename__)
         db.session.commit()
+        invalidate_catalogue(Films)
+        record_change(Films, added=[(film.id, film.name)])
         response_body["message"] = "Film added"
         response_body["result"] = film.serialize()
         return response_body, 200
 
 
 @app.route("/species", methods=["GET", "POST"])
+@query_budget(3)
+@conditional(lambda: [Species.__tablename__])
 def handle_species():
     response_body = {}
     if request.method == "GET":
-        species = db.session.execute(db.select(Species)).scalars()
+        if "q" in request.args:
+            q, offset, limit = get_search_args()
+            species, next_offset = catalogue_search(Species, q, offset, limit)
+            response_body["message"] = "Species List"
+            response_body["results"] = species
+            response_body["next_offset"] = next_offset
+            return response_body, 200
+        if wants_stream():
+            return stream_response(stream_rows(Species, get_int_arg("after", 0)), "Species List")
+        after, limit = get_page_args()
+        species, next_cursor = catalogue_page(Species, after, limit)
         response_body["message"] = "Species List"
-        response_body["results"] = [row.serialize() for row in species]
+        response_body["results"] = species
+        response_body["next_cursor"] = next_cursor
         return response_body, 200
     if request.method == "POST":
+        items = read_json_items()
+        if items is not None:
+            added, skipped = bulk_insert_names(Species, items)
+            db.session.commit()
+            invalidate_catalogue(Species)
+            record_change(Species, added=added)
+            response_body["message"] = "Species added"
+            response_body["inserted"] = len(added)
+            response_body["skipped"] = skipped
+            return response_body, 200
         data = request.json
         specie = Species(name = data["name"])
         db.session.add(specie)
+        bump_versions(Species.__tablename__)
         db.session.commit()
+        invalidate_catalogue(Species)
+        record_change(Species, added=[(specie.id, specie.name)])
         response_body["message"] = "Specie added"
         response_body["result"] = specie.serialize()
         return response_body, 200 
 
 
+@app.route("/search")
+@query_budget(9)
+@conditional(lambda: [model.__tablename__ for model in SEARCH_KINDS.values()])
+def handle_search():
+    response_body = {}
+    q, offset, limit = get_search_args()
+    kinds = request.args.get("kind")
+    kinds = kinds.split(",") if kinds else list(SEARCH_KINDS)
+    unknown = [kind for kind in kinds if kind not in SEARCH_KINDS]
+    if unknown:
+        response_body["message"] = f"Error: unknown kind {', '.join(unknown)}"
+        return response_body, 400
+    results, next_offset = search_catalogue(q, kinds, offset, limit)
+    response_body["message"] = "Search results"
+    response_body["results"] = results
+    response_body["next_offset"] = next_offset
+    return response_body, 200
+
+
+@app.route("/autocomplete")
+@query_budget(5)
+def handle_autocomplete():
+    response_body = {}
+    q = request.args.get("q", "").strip()
+    if not q:
+        response_body["message"] = "Error: 'q' can not be empty"
+        return response_body, 400
+    limit = min(get_int_arg("limit", AUTOCOMPLETE_DEFAULT_LIMIT, minimum=1), AUTOCOMPLETE_MAX_LIMIT)
+    kinds = request.args.get("kind")
+    kinds = kinds.split(",") if kinds else None
+    unknown = [kind for kind in kinds or [] if kind not in SEARCH_KINDS]
+    if unknown:
+        response_body["message"] = f"Error: unknown kind {', '.join(unknown)}"
+        return response_body, 400
+    refresh_index()
+    response_body["message"] = "Suggestions"
+    response_body["results"] = name_index.suggest(q, limit, kinds)
+    return response_body, 200
+
+
 @app.route("/users/<int:id>", methods=["GET", "DELETE", "PATCH"])
+@query_budget(5)
 def handle_user(id):
     response_body = {}
     user = db.session.get(Users, id)
@@ -147,6 +324,8 @@ def handle_user(id):
     if request.method == "DELETE":
         if user:
             db.session.delete(user)
+            delete_user_favourites(id)
+            bump_versions(Users.__tablename__, favourites_key(id))
             db.session.commit()
             response_body["message"] = "User delete"
             response_body["user delete"] = user.serialize()
@@ -162,6 +341,7 @@ def handle_user(id):
             if 'password' in data:
                 user.password = data["password"]
             db.session.add(user)
+            bump_versions(Users.__tablename__)
             db.session.commit()
             response_body["message"] = "User update"
             response_body["result"] = user.serialize()
@@ -172,6 +352,7 @@ def handle_user(id):
 
 
 @app.route("/planets/<int:id>", methods=["GET", "DELETE", "PUT"])
+@query_budget(9)
 def handle_planet(id):
     response_body = {}
     planet = db.session.get(Planets, id)
@@ -186,7 +367,11 @@ def handle_planet(id):
     if request.method == "DELETE":
         if planet:
             db.session.delete(planet)
+            refresh_item_snapshots(Planets, id, deleted=True)
+            bump_versions(Planets.__tablename__)
             db.session.commit()
+            invalidate_catalogue(Planets)
+            record_change(Planets, removed=[(planet.id, planet.name)])
             response_body["message"] = "Planet delete"
             response_body["planet delete"] = planet.serialize()
             return response_body, 200
@@ -196,9 +381,14 @@ def handle_planet(id):
     if request.method == "PUT":
         if planet:
             data = request.json
+            previous_name = planet.name
             planet.name = data["name"]
             db.session.add(planet)
+            refresh_item_snapshots(Planets, id)
+            bump_versions(Planets.__tablename__)
             db.session.commit()
+            invalidate_catalogue(Planets)
+            record_change(Planets, added=[(planet.id, planet.name)], removed=[(planet.id, previous_name)])
             response_body["message"] = "Planet update"
             response_body["result"] = planet.serialize()
             return response_body, 200
@@ -208,11 +398,12 @@ def handle_planet(id):
         
 
 @app.route("/characters/<int:id>", methods=["GET", "DELETE", "PUT"])
+@query_budget(9)
 def handle_character(id):
     response_body = {}
     character = db.session.get(Characters, id)
     if request.method == "GET":
-        if characters:
+        if character:
             response_body["message"] = "Metodo GET de characters"
             response_body["result"] = character.serialize()
             return response_body, 200
@@ -220,9 +411,13 @@ def handle_character(id):
             response_body["message"] = "Character not found"
             return response_body, 404
     if request.method == "DELETE":
-        if characters:
+        if character:
             db.session.delete(character)
+            refresh_item_snapshots(Characters, id, deleted=True)
+            bump_versions(Characters.__tablename__)
             db.session.commit()
+            invalidate_catalogue(Characters)
+            record_change(Characters, removed=[(character.id, character.name)])
             response_body["message"] = "Character delete"
             response_body["character delete"] = character.serialize()
             return response_body, 200
@@ -232,9 +427,14 @@ def handle_character(id):
     if request.method == "PUT":
         if character:
             data = request.json
+            previous_name = character.name
             character.name = data["name"]
             db.session.add(character)
+            refresh_item_snapshots(Characters, id)
+            bump_versions(Characters.__tablename__)
             db.session.commit()
+            invalidate_catalogue(Characters)
+            record_change(Characters, added=[(character.id, character.name)], removed=[(character.id, previous_name)])
             response_body["message"] = "Character update"
             response_body["result"] = character.serialize()
             return response_body, 200
@@ -244,6 +444,7 @@ def handle_character(id):
         
 
 @app.route("/films/<int:id>", methods=["GET", "DELETE", "PUT"])
+@query_budget(9)
 def handle_film(id):
     response_body = {}
     film = db.session.get(Films, id)
@@ -258,7 +459,11 @@ def handle_film(id):
     if request.method == "DELETE":
         if film:
             db.session.delete(film)
+            refresh_item_snapshots(Films, id, deleted=True)
+            bump_versions(Films.__tablename__)
             db.session.commit()
+            invalidate_catalogue(Films)
+            record_change(Films, removed=[(film.id, film.name)])
             response_body["message"] = "Character delete"
             response_body["film delete"] = film.serialize()
             return response_body, 200
@@ -268,9 +473,14 @@ def handle_film(id):
     if request.method == "PUT":
         if film:
             data = request.json
+            previous_name = film.name
             film.name = data["name"]
             db.session.add(film)
+            refresh_item_snapshots(Films, id)
+            bump_versions(Films.__tablename__)
             db.session.commit()
+            invalidate_catalogue(Films)
+            record_change(Films, added=[(film.id, film.name)], removed=[(film.id, previous_name)])
             response_body["message"] = "Film update"
             response_body["result"] = film.serialize()
             return response_body, 200
@@ -280,6 +490,7 @@ def handle_film(id):
 
 
 @app.route("/species/<int:id>", methods=["GET", "DELETE", "PUT"])
+@query_budget(9)
 def handle_specie(id):
     response_body = {}
     specie = db.session.get(Species, id)
@@ -294,7 +505,11 @@ def handle_specie(id):
     if request.method == "DELETE":
         if specie:
             db.session.delete(specie)
+            refresh_item_snapshots(Species, id, deleted=True)
+            bump_versions(Species.__tablename__)
             db.session.commit()
+            invalidate_catalogue(Species)
+            record_change(Species, removed=[(specie.id, specie.name)])
             response_body["message"] = "Specie delete"
             response_body["planet delete"] = specie.serialize()
             return response_body, 200
@@ -304,9 +519,14 @@ def handle_specie(id):
     if request.method == "PUT":
         if specie:
             data = request.json
+            previous_name = specie.name
             specie.name = data["name"]
             db.session.add(specie)
+            refresh_item_snapshots(Species, id)
+            bump_versions(Species.__tablename__)
             db.session.commit()
+            invalidate_catalogue(Species)
+            record_change(Species, added=[(specie.id, specie.name)], removed=[(specie.id, previous_name)])
             response_body["message"] = "Specie update"
             response_body["result"] = specie.serialize()
             return response_body, 200
@@ -316,26 +536,23 @@ def handle_specie(id):
 
 
 @app.route("/users/<int:id>/favourites/films", methods=["GET", "POST"])
+@query_budget(8)
+@conditional(lambda id: [favourites_key(id), Films.__tablename__, Users.__tablename__])
 def handle_favourites_films(id):
     response_body = {}
     user = db.session.get(Users, id)
-    favourite_films = (
-        db.session.query(Films)
-        .join(FavouritesFilms, FavouritesFilms.film_id == Films.id)
-        .filter(FavouritesFilms.user_id == user.id if user else None)
-        .all()
-    )
     if not user:
         response_body["message"] = "User not found"
         return response_body, 404
     else:
         if request.method == "GET":
+            favourite_films = favourite_items("films", user.id)
             if favourite_films:
                 response_body["message"] = "Favourites films"
                 response_body["result"] = {
                         "user_id": user.id,
                         "email": user.email,
-                        "favourite_films": [film.serialize() for film in favourite_films]
+                        "favourite_films": favourite_films
                     }
                 return response_body, 200
             else:
@@ -347,48 +564,43 @@ def handle_favourites_films(id):
                 response_body["message"] = "Error: insert the Film ID"
                 return response_body, 400
             else:
-                film_id = data["film_id"]
-            existing_film = Films.query.get(film_id)
-            if not existing_film:
+                film_id = to_item_id(data["film_id"], "film_id")
+            status = insert_favourite("films", user.id, film_id)
+            if status == "not_found":
                 response_body["message"] = f"Error: film with ID {film_id} does no exist"
                 return response_body, 404
-            existing_favourite_film = FavouritesFilms.query.filter_by(user_id=user.id, film_id=film_id).first()
-            if existing_favourite_film:
+            if status == "duplicate":
                 response_body["message"] = "The film is already in the favourites"
                 return response_body, 400
             else:
-                new_favourite_film = FavouritesFilms(user_id=user.id, film_id=film_id)
-                db.session.add(new_favourite_film)
-                db.session.commit()
+                film = get_catalogue_item(Films, film_id)
                 response_body["message"] = "Film added in a favourites list"
                 response_body["result"] = {
                     "email": user.email,
-                    "favourite_film": new_favourite_film.film.serialize()
+                    "favourite_film": film
                 }
+                db.session.commit()
         return response_body, 201
 
 
 @app.route("/users/<int:id>/favourites/planets", methods=["GET", "POST"])
+@query_budget(8)
+@conditional(lambda id: [favourites_key(id), Planets.__tablename__, Users.__tablename__])
 def handle_favourites_planets(id):
     response_body = {}
-    user = Users.query.get(id)
-    favourites_planets = (
-        db.session.query(Planets)
-        .join(FavouritesPlanets, FavouritesPlanets.planet_id == Planets.id)
-        .filter(FavouritesPlanets.user_id == user.id if user else None)
-        .all()
-    )
+    user = db.session.get(Users, id)
     if not user:
         response_body["message"] = "User not found"
         return response_body, 404
     else:
         if request.method == "GET":
+            favourites_planets = favourite_items("planets", user.id)
             if favourites_planets:
                 response_body["message"] = "Favourites planets"
                 response_body["result"] = {
                         "user_id": user.id,
                         "email": user.email,
-                        "favourites_planets": [planet.serialize() for planet in favourites_planets]
+                        "favourites_planets": favourites_planets
                     }
                 return response_body, 200
             else:
@@ -400,49 +612,44 @@ def handle_favourites_planets(id):
                 response_body["message"] = "Error: insert the Planet ID"
                 return response_body, 400
             else:
-                planet_id = data["planet_id"]
-            existing_planet = Planets.query.get(planet_id)
-            if not existing_planet:
+                planet_id = to_item_id(data["planet_id"], "planet_id")
+            status = insert_favourite("planets", user.id, planet_id)
+            if status == "not_found":
                 response_body["message"] = f"Error: planet with ID {planet_id} does  no exist"
                 return response_body, 404
-            existing_favourite_planet = FavouritesPlanets.query.filter_by(user_id=user.id, planet_id=planet_id).first()
-            if existing_favourite_planet:
+            if status == "duplicate":
                 response_body["message"] = "The planet is already in the favourites"
                 return response_body, 400
             else:
-                new_favourite_planet = FavouritesPlanets(user_id=user.id, planet_id=planet_id)
-                db.session.add(new_favourite_planet)
-                db.session.commit()
+                planet = get_catalogue_item(Planets, planet_id)
                 response_body["message"] = "Planets added in a favourites list"
                 response_body["result"] = {
                     "user_id": user.id,
                     "email": user.email,
-                    "favourite_planet": new_favourite_planet.planet.serialize()
+                    "favourite_planet": planet
                 }
+                db.session.commit()
         return response_body, 201
 
 
 @app.route("/users/<int:id>/favourites/species", methods=["GET", "POST"])
+@query_budget(8)
+@conditional(lambda id: [favourites_key(id), Species.__tablename__, Users.__tablename__])
 def handle_favourites_species(id):
     response_body = {}
     user = db.session.get(Users, id)
-    favourite_species = (
-        db.session.query(Species)
-        .join(FavouritesSpecies, FavouritesSpecies.specie_id == Species.id)
-        .filter(FavouritesSpecies.user_id == user.id)
-        .all()
-    )
     if not user:
         response_body["message"] = "User not found"
         return response_body, 404
     else:
         if request.method == "GET":
+            favourite_species = favourite_items("species", user.id)
             if favourite_species:
                 response_body["message"] = "Favourites species"
                 response_body["result"] = {
                         "user_id": user.id,
                         "email": user.email,
-                        "favourite_species": [specie.serialize() for specie in favourite_species]
+                        "favourite_species": favourite_species
                     }
                 return response_body, 200
             else:
@@ -454,48 +661,43 @@ def handle_favourites_species(id):
                 response_body["message"] = "Error: insert the Specie ID"
                 return response_body, 400
             else:
-                specie_id = data["specie_id"]
-            existing_specie = Species.query.get(specie_id)
-            if not existing_specie:
+                specie_id = to_item_id(data["specie_id"], "specie_id")
+            status = insert_favourite("species", user.id, specie_id)
+            if status == "not_found":
                 response_body["message"] = f"Error: specie with ID {specie_id} does no exist"
                 return response_body, 404
-            existing_favourite_specie = FavouritesSpecies.query.filter_by(user_id=user.id, specie_id=specie_id).first()
-            if existing_favourite_specie:
+            if status == "duplicate":
                 response_body["message"] = "The specie is already in the favourites"
                 return response_body, 400
             else:
-                new_favourite_specie = FavouritesSpecies(user_id=user.id, specie_id=specie_id)
-                db.session.add(new_favourite_specie)
-                db.session.commit()
+                specie = get_catalogue_item(Species, specie_id)
                 response_body["message"] = "Specie added in a favourites list"
                 response_body["result"] = {
                     "email": user.email,
-                    "favourite_specie": new_favourite_specie.specie.serialize()
+                    "favourite_specie": specie
                 }
+                db.session.commit()
         return response_body, 201
 
 
 @app.route("/users/<int:id>/favourites/characters", methods=["GET", "POST"])
+@query_budget(8)
+@conditional(lambda id: [favourites_key(id), Characters.__tablename__, Users.__tablename__])
 def handle_favourites_characters(id):
     response_body = {}
     user = db.session.get(Users, id)
-    favourite_characters = (
-        db.session.query(Characters)
-        .join(FavouritesCharacters, FavouritesCharacters.character_id == Characters.id)
-        .filter(FavouritesCharacters.user_id == user.id if user else None)
-        .all()
-    )
     if not user:
         response_body["message"] = "User not found"
         return response_body, 404
     else:
         if request.method == "GET":
+            favourite_characters = favourite_items("characters", user.id)
             if favourite_characters:
                 response_body["message"] = "Favourites characters"
                 response_body["result"] = {
                         "user_id": user.id,
                         "email": user.email,
-                        "favourite_characters": [character.serialize() for character in favourite_characters]
+                        "favourite_characters": favourite_characters
                     }
                 return response_body, 200
             else:
@@ -507,74 +709,90 @@ def handle_favourites_characters(id):
                 response_body["message"] = "Error: insert the character ID"
                 return response_body, 400
             else:
-                character_id = data["character_id"]
-            existing_character = Characters.query.get(character_id)
-            if not existing_character:
+                character_id = to_item_id(data["character_id"], "character_id")
+            status = insert_favourite("characters", user.id, character_id)
+            if status == "not_found":
                 response_body["message"] = f"Error: character with ID {character_id} does no exist"
                 return response_body, 404
-            existing_favourite_character = FavouritesCharacters.query.filter_by(user_id=user.id, character_id=character_id).first()
-            if existing_favourite_character:
+            if status == "duplicate":
                 response_body["message"] = "The character is already in the favourites"
                 return response_body, 400
             else:
-                new_favourite_character = FavouritesCharacters(user_id=user.id, character_id=character_id)
-                db.session.add(new_favourite_character)
-                db.session.commit()
+                character = get_catalogue_item(Characters, character_id)
                 response_body["message"] = "Character added in a favourites list"
                 response_body["result"] = {
                     "email": user.email,
-                    "favourite_character": new_favourite_character.character.serialize()
+                    "favourite_character": character
                 }
+                db.session.commit()
         return response_body, 201
 
     
 @app.route("/users/<int:id>/favourites")
+@query_budget(3)
+@conditional(lambda id: [favourites_key(id)])
 def handle_user_favourites(id):
     response_body = {}
-    user = Users.query.get(id)
-    if not user:
+    # La copia ya montada; los usuarios sin copia salen del UNION de las tablas
+    favourites = read_snapshot(id)
+    if favourites is None:
+        favourites = user_favourites(id)
+    if favourites is None:
         response_body["message"] = "User not found"
         return jsonify(response_body), 404
-    favourite_characters = (
-        db.session.query(Characters)
-        .join(FavouritesCharacters, FavouritesCharacters.character_id == Characters.id)
-        .filter(FavouritesCharacters.user_id == user.id if user else None)
-        .all()
-    )
-    favourite_species = (
-        db.session.query(Species)
-        .join(FavouritesSpecies, FavouritesSpecies.specie_id == Species.id)
-        .filter(FavouritesSpecies.user_id == user.id if user else None)
-        .all()
-    )
-    favourites_planets = (
-        db.session.query(Planets)
-        .join(FavouritesPlanets, FavouritesPlanets.planet_id == Planets.id)
-        .filter(FavouritesPlanets.user_id == user.id if user else None)
-        .all()
-    )
-    favourite_films = (
-        db.session.query(Films)
-        .join(FavouritesFilms, FavouritesFilms.film_id == Films.id)
-        .filter(FavouritesFilms.user_id == user.id if user else None)
-        .all()
-    )
-    if not (favourite_characters or favourite_species or favourites_planets or favourite_films):
+    if not any(favourites.values()):
         response_body["message"] = "User have no favorites"
         return jsonify(response_body), 404
     else:
         response_body["message"] = "User's favourites"
-        response_body["result"] = {
-            "characters": [character.serialize() for character in favourite_characters],
-            "species": [specie.serialize() for specie in favourite_species],
-            "planets": [planet.serialize() for planet in favourites_planets],
-            "films": [film.serialize() for film in favourite_films],
-        }
+        response_body["result"] = favourites
         return jsonify(response_body), 200
 
 
+@app.route("/users/<int:id>/favourites/batch", methods=["POST"])
+@query_budget(8)
+def handle_favourites_batch(id):
+    response_body = {}
+    user = db.session.get(Users, id)
+    if not user:
+        response_body["message"] = "User not found"
+        return response_body, 404
+    data = request.json
+    operations = data.get("operations") if isinstance(data, dict) else data
+    if not isinstance(operations, list):
+        response_body["message"] = "Error: send a list of operations"
+        return response_body, 400
+    if len(operations) > MAX_BATCH_SIZE:
+        response_body["message"] = f"Error: a batch can have at most {MAX_BATCH_SIZE} operations"
+        return response_body, 400
+    results = apply_favourites_batch(user.id, operations)
+    db.session.commit()
+    response_body["message"] = "Favourites updated"
+    response_body["results"] = results
+    return response_body, 200
+
+
+def delete_favourite_minimal(kind, user_id, item_id, message, not_found_message):
+    # DELETE con ?return=minimal o Prefer: return=minimal: solo la clave
+    # borrada, sin volver a leer la lista. El usuario solo se busca si no se
+    # ha borrado nada, para distinguir los dos 404.
+    response_body = {}
+    if not delete_favourite(kind, user_id, item_id):
+        user = db.session.get(Users, user_id)
+        response_body["message"] = not_found_message if user else "Error: User not found"
+        return response_body, 404
+    db.session.commit()
+    response_body["message"] = message
+    response_body["result"] = {"user": user_id, UserFavourites.FIELDS[kind]: item_id}
+    headers = {"Preference-Applied": "return=minimal"} if prefer_return() == "minimal" else {}
+    return response_body, 200, headers
+
+
 @app.route("/users/<int:id>/favourites/films/<int:film_id>", methods=["DELETE", "GET"])
+@query_budget(9)
 def handle_delete_favourites_film(id, film_id):
+    if request.method == "DELETE" and wants_minimal():
+        return delete_favourite_minimal("films", id, film_id, "Film removed from favorites", "Error: Film not found in user's favorites")
     response_body = {}
     user = db.session.query(Users).get(id)
     if not user:
@@ -582,48 +800,35 @@ def handle_delete_favourites_film(id, film_id):
         return response_body, 404
     else:
         if request.method == "DELETE":
-            favourite_film = (
-                db.session.query(FavouritesFilms)
-                .filter_by(user_id=user.id, film_id=film_id)
-                .first()
-            )
-            if favourite_film:
-                db.session.delete(favourite_film)
+            if delete_favourite("films", user.id, film_id):
                 db.session.commit()
-                user_favourite_films = (
-                    db.session.query(Films)
-                    .join(FavouritesFilms, FavouritesFilms.film_id == Films.id)
-                    .filter(FavouritesFilms.user_id == user.id)
-                    .all()
-                )
+                user_favourite_films = favourite_items("films", user.id)
                 response_body["message"] = "Film removed from favorites"
                 response_body["result"] = {
                     "user_id": user.id,
                     "email": user.email,
-                    "favourite_films": [film.serialize() for film in user_favourite_films]
+                    "favourite_films": user_favourite_films
                 }
                 return response_body, 200
             else:
                 response_body["message"] = "Error: Film not found in user's favorites"
                 return response_body, 404
         if request.method == "GET":
-            favourite_film = (
-                db.session.query(FavouritesFilms)
-                .filter_by(user_id=user.id, film_id=film_id)
-                .first()
-            )
+            favourite_film = find_favourite("films", user.id, film_id)
             if favourite_film:
                 response_body["message"] = f'Favourite film, with id: {film_id}'
                 response_body["result"] = favourite_film.serialize()
                 return response_body, 200
-                print(response_body)
             else:
                 response_body["message"] = "Film not found"
                 return response_body, 400
 
 
 @app.route("/users/<int:id>/favourites/planets/<int:planet_id>", methods=["DELETE", "GET"])
+@query_budget(9)
 def handle_delete_favourites_planet(id, planet_id):
+    if request.method == "DELETE" and wants_minimal():
+        return delete_favourite_minimal("planets", id, planet_id, "Planet removed from favorites", "Error: Planet not found in user's favorites")
     response_body = {}
     user = db.session.query(Users).get(id)
     if not user:
@@ -631,36 +836,21 @@ def handle_delete_favourites_planet(id, planet_id):
         return response_body, 404
     else:
         if request.method == "DELETE":
-            favourite_planet = (
-                db.session.query(FavouritesPlanets)
-                .filter_by(user_id=user.id, planet_id=planet_id)
-                .first()
-            )
-            if favourite_planet:
-                db.session.delete(favourite_planet)
+            if delete_favourite("planets", user.id, planet_id):
                 db.session.commit()
-                user_favourite_planets = (
-                    db.session.query(Planets)
-                    .join(FavouritesPlanets, FavouritesPlanets.planet_id == Planets.id)
-                    .filter(FavouritesPlanets.user_id == user.id)
-                    .all()
-                )
+                user_favourite_planets = favourite_items("planets", user.id)
                 response_body["message"] = "Planet removed from favorites"
                 response_body["result"] = {
                     "user_id": user.id,
                     "email": user.email,
-                    "favourite_planet": [planet.serialize() for planet in user_favourite_planets]
+                    "favourite_planet": user_favourite_planets
                 }
                 return response_body, 200
             else:
                 response_body["message"] = "Error: Planet not found in user's favorites"
                 return response_body, 404
         if request.method == "GET":
-            favourite_planet = (
-                db.session.query(FavouritesPlanets)
-                .filter_by(user_id=user.id, planet_id=planet_id)
-                .first()
-            )
+            favourite_planet = find_favourite("planets", user.id, planet_id)
             if favourite_planet:
                 response_body["message"] = f'Planet with id: {planet_id}'
                 response_body["result"] = favourite_planet.serialize()
@@ -671,7 +861,10 @@ def handle_delete_favourites_planet(id, planet_id):
 
 
 @app.route("/users/<int:id>/favourites/species/<int:specie_id>", methods=["DELETE", "GET"])
+@query_budget(9)
 def handle_delete_favourites_specie(id, specie_id):
+    if request.method == "DELETE" and wants_minimal():
+        return delete_favourite_minimal("species", id, specie_id, "Species removed from favorites", "Error: Species not found in user's favorites")
     response_body = {}
     user = db.session.query(Users).get(id)
     if not user:
@@ -679,36 +872,21 @@ def handle_delete_favourites_specie(id, specie_id):
         return response_body, 404
     else:
         if request.method == "DELETE":
-            favourite_specie = (
-                db.session.query(FavouritesSpecies)
-                .filter_by(user_id=user.id, specie_id=specie_id)
-                .first()
-            )
-            if favourite_specie:
-                db.session.delete(favourite_specie)
+            if delete_favourite("species", user.id, specie_id):
                 db.session.commit()
-                user_favourite_species = (
-                    db.session.query(Planets)
-                    .join(FavouritesSpecies, FavouritesSpecies.specie_id == Species.id)
-                    .filter(FavouritesSpecies.user_id == user.id)
-                    .all()
-                )
+                user_favourite_species = favourite_items("species", user.id)
                 response_body["message"] = "Species removed from favorites"
                 response_body["result"] = {
                     "user_id": user.id,
                     "email": user.email,
-                    "favourite_specie": [specie.serialize() for specie in user_favourite_species]
+                    "favourite_specie": user_favourite_species
                 }
                 return response_body, 200
             else:
                 response_body["message"] = "Error: Species not found in user's favorites"
                 return response_body, 404
         if request.method == "GET":
-            favourite_specie = (
-                db.session.query(FavouritesSpecies)
-                .filter_by(user_id=user.id, specie_id=specie_id)
-                .first()
-            )
+            favourite_specie = find_favourite("species", user.id, specie_id)
             if favourite_specie:
                 response_body["message"] = f'Specie with id: {specie_id}'
                 response_body["result"] = favourite_specie.serialize()
@@ -719,7 +897,10 @@ def handle_delete_favourites_specie(id, specie_id):
     
 
 @app.route("/users/<int:id>/favourites/characters/<int:character_id>", methods=["DELETE", "GET"])
+@query_budget(9)
 def handle_delete_favourites_character(id, character_id):
+    if request.method == "DELETE" and wants_minimal():
+        return delete_favourite_minimal("characters", id, character_id, "Characters removed from favorites", "Error: Characters not found in user's favorites")
     response_body = {}
     user = db.session.query(Users).get(id)
     if not user:
@@ -727,36 +908,21 @@ def handle_delete_favourites_character(id, character_id):
         return response_body, 404
     else:
         if request.method == "DELETE":
-            favourite_character = (
-                db.session.query(FavouritesCharacters)
-                .filter_by(user_id=user.id, character_id=character_id)
-                .first()
-            )
-            if favourite_character:
-                db.session.delete(favourite_character)
+            if delete_favourite("characters", user.id, character_id):
                 db.session.commit()
-                user_favourite_characters = (
-                    db.session.query(Characters)
-                    .join(FavouritesCharacters, FavouritesCharacters.character_id == Characters.id)
-                    .filter(FavouritesCharacters.user_id == user.id)
-                    .all()
-                )
+                user_favourite_characters = favourite_items("characters", user.id)
                 response_body["message"] = "Characters removed from favorites"
                 response_body["result"] = {
                     "user_id": user.id,
                     "email": user.email,
-                    "favourite_character": [character.serialize() for character in user_favourite_characters]
+                    "favourite_character": user_favourite_characters
                 }
                 return response_body, 200
             else:
                 response_body["message"] = "Error: Characters not found in user's favorites"
                 return response_body, 404
         if request.method == "GET":
-            favourite_character = (
-                db.session.query(FavouritesCharacters)
-                .filter_by(user_id=user.id, character_id=character_id)
-                .first()
-            )
+            favourite_character = find_favourite("characters", user.id, character_id)
             if favourite_character:
                 response_body["message"] = f'Character with id: {character_id}'
                 response_body["result"] = favourite_character.serialize()
@@ -0,0 +1,154 @@
+"""
+ASGI entry point for the async serving mode. The hot read endpoints (the
+catalogue and users lists and GET /users/<id>/favourites) run as async
+handlers on SQLAlchemy's async engine (aiosqlite / asyncpg), with the same
+routes, responses, ETags and compression as the Flask app. Every other
+request is served by the Flask app through asgiref.
+
+    uvicorn asgi:application --app-dir src
+    gunicorn asgi:application --chdir ./src/ -k uvicorn.workers.UvicornWorker
+"""
+import re
+from urllib.parse import parse_qsl
+from asgiref.wsgi import WsgiToAsgi
+from werkzeug.datastructures import MultiDict, MIMEAccept
+from werkzeug.http import parse_accept_header, parse_etags
+from app import app
+from models import Users, Films, Characters, Species, Planets
+from utils import APIException, get_page_args, MAX_INT64, NDJSON_MIMETYPES
+from queries import keyset_select, keyset_result, versions_select, versions_result, favourites_key, user_favourites_result, USER_FAVOURITES_SELECT, SNAPSHOT_SELECT
+from http_cache import etag_for, matching_etag
+from compression import compress_body
+from database import create_async_db_engine
+
+
+engine = create_async_db_engine(app.config['SQLALCHEMY_DATABASE_URI'])
+
+
+class AsyncRequest:
+    def __init__(self, scope):
+        self.method = scope["method"]
+        self.path = scope["path"]
+        self.query_string = scope["query_string"].decode("latin-1")
+        self.full_path = f"{self.path}?{self.query_string}"
+        self.headers = {name.decode("latin-1").lower(): value.decode("latin-1") for name, value in scope["headers"]}
+        self.args = MultiDict(parse_qsl(self.query_string, keep_blank_values=True))
+        self.accept_mimetypes = parse_accept_header(self.headers.get("accept"), MIMEAccept)
+        self.accept_encodings = parse_accept_header(self.headers.get("accept-encoding"))
+        self.if_none_match = parse_etags(self.headers.get("if-none-match"))
+
+    def wants_stream(self):
+        best = self.accept_mimetypes.best_match(("application/json",) + NDJSON_MIMETYPES)
+        return self.args.get("stream") in ("1", "true") or best in NDJSON_MIMETYPES
+
+
+async def send_response(send, request, status, body=None, etag=None):
+    headers = [(b"access-control-allow-origin", b"*"), (b"vary", b"Accept-Encoding")]
+    data = b""
+    if body is not None:
+        data = app.json.dumps(body).encode() + b"\n"
+        headers.append((b"content-type", b"application/json"))
+        if status == 200:
+            data, encoding = compress_body(data, request.accept_encodings, etag)
+            if encoding:
+                headers.append((b"content-encoding", encoding.encode()))
+                etag = f"{etag}-{encoding}" if etag else None
+    if etag:
+        headers.append((b"etag", f'"{etag}"'.encode()))
+    headers.append((b"content-length", str(len(data)).encode()))
+    await send({"type": "http.response.start", "status": status, "headers": headers})
+    await send({"type": "http.response.body", "body": data})
+
+
+async def conditional(connection, request, keys):
+    # Devuelve (etag, etag que coincide con If-None-Match o None)
+    versions = versions_result(keys, (await connection.execute(versions_select(keys))).all())
+    etag = etag_for(request.full_path, request.accept_mimetypes, versions, keys)
+    return etag, matching_etag(etag, request.if_none_match, request.accept_encodings)
+
+
+def list_handler(model, message):
+    async def handler(request, send):
+        # El streaming y las busquedas (?q=) los sirve la app Flask
+        if request.wants_stream() or "q" in request.args:
+            return False
+        after, limit = get_page_args(request.args)
+        async with engine.connect() as connection:
+            etag, matched = await conditional(connection, request, [model.__tablename__])
+            if matched:
+                await send_response(send, request, 304, etag=matched)
+                return True
+            rows = (await connection.execute(keyset_select(model, after, limit))).all()
+        results, next_cursor = keyset_result(model, rows, limit)
+        body = {"message": message, "results": results, "next_cursor": next_cursor}
+        await send_response(send, request, 200, body, etag)
+        return True
+    return handler
+
+
+async def user_favourites_handler(request, send, id):
+    id = int(id)
+    if id > MAX_INT64:
+        # Flask responde el 404 del id fuera de rango
+        return False
+    keys = [favourites_key(id)]
+    async with engine.connect() as connection:
+        etag, matched = await conditional(connection, request, keys)
+        if matched:
+            await send_response(send, request, 304, etag=matched)
+            return True
+        favourites = (await connection.execute(SNAPSHOT_SELECT, {"user_id": id})).scalar_one_or_none()
+        if favourites is None:
+            rows = (await connection.execute(USER_FAVOURITES_SELECT, {"user_id": id})).all()
+            favourites = user_favourites_result(rows)
+    if favourites is None:
+        await send_response(send, request, 404, {"message": "User not found"})
+    elif not any(favourites.values()):
+        await send_response(send, request, 404, {"message": "User have no favorites"})
+    else:
+        await send_response(send, request, 200, {"message": "User's favourites", "result": favourites}, etag)
+    return True
+
+
+ROUTES = [
+    (re.compile(r"^/users/?$"), list_handler(Users, "Metodo GET de users")),
+    (re.compile(r"^/planets/?$"), list_handler(Planets, "Planets List")),
+    (re.compile(r"^/characters/?$"), list_handler(Characters, "Characters List")),
+    (re.compile(r"^/films/?$"), list_handler(Films, "Films List")),
+    (re.compile(r"^/species/?$"), list_handler(Species, "Species List")),
+    (re.compile(r"^/users/(?P<id>\d+)/favourites/?$"), user_favourites_handler),
+]
+
+
+class AsyncAPI:
+    def __init__(self, fallback):
+        self.fallback = fallback
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                await engine.dispose()
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            return await self.lifespan(receive, send)
+        if scope["type"] == "http" and scope["method"] == "GET":
+            for pattern, handler in ROUTES:
+                match = pattern.match(scope["path"])
+                if match:
+                    request = AsyncRequest(scope)
+                    try:
+                        if await handler(request, send, **match.groupdict()):
+                            return
+                    except APIException as error:
+                        return await send_response(send, request, error.status_code, error.to_dict())
+                    break
+        await self.fallback(scope, receive, send)
+
+
+application = AsyncAPI(WsgiToAsgi(app))
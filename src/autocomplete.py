@@ -0,0 +1,178 @@
+"""
+Typeahead over every catalogue name, answered from memory. The index is a
+sorted array of lowercased names: a prefix lookup is a binary search plus a
+scan of the matches, without touching the database.
+
+It is built on the first request. The catalogue write handlers apply their
+own changes to it; writes made by other workers are picked up within
+AUTOCOMPLETE_REFRESH seconds, when a request finds that the resource
+versions of the catalogue tables moved (one small query per period).
+"""
+import os
+import time
+from array import array
+from bisect import bisect_left
+from heapq import merge
+from threading import Lock
+from flask import g
+from models import db
+from queries import get_versions
+from search import SEARCH_KINDS
+
+
+AUTOCOMPLETE_REFRESH = float(os.getenv("AUTOCOMPLETE_REFRESH", 30))
+AUTOCOMPLETE_DEFAULT_LIMIT = 10
+AUTOCOMPLETE_MAX_LIMIT = 100
+
+# Con mas altas que esto (cargas masivas) se mezclan en una pasada en vez de
+# insertarlas de una en una, cada insercion mueve medio array
+MERGE_THRESHOLD = 64
+
+
+class NameIndex:
+    # Arrays paralelos ordenados por nombre en minusculas: la clave, el nombre
+    # original (el mismo objeto si ya estaba en minusculas), el codigo del tipo
+    # y el id (con signo, 64 bits: cualquier id que aceptan las rutas)
+    def __init__(self, kinds):
+        self.kinds = list(kinds)
+        self._codes = {kind: code for code, kind in enumerate(self.kinds)}
+        self._keys = []
+        self._names = []
+        self._codes_at = array("B")
+        self._ids = array("q")
+        self.versions = None
+        self.checked_at = 0.0
+        self._lock = Lock()
+
+    def __len__(self):
+        return len(self._keys)
+
+    @property
+    def ready(self):
+        return self.versions is not None
+
+    def build(self, rows, versions):
+        # rows: (kind, id, name). Se construye aparte y se cambia de golpe,
+        # las busquedas siguen usando el indice anterior mientras tanto
+        entries = sorted((name.lower(), name, self._codes[kind], item_id) for kind, item_id, name in rows)
+        keys = [key for key, name, code, item_id in entries]
+        names = [key if key == name else name for key, name, code, item_id in entries]
+        codes = array("B", (code for key, name, code, item_id in entries))
+        ids = array("q", (item_id for key, name, code, item_id in entries))
+        with self._lock:
+            self._keys, self._names, self._codes_at, self._ids = keys, names, codes, ids
+            self.versions = dict(versions)
+            self.checked_at = time.monotonic()
+
+    def suggest(self, prefix, limit, kinds=None):
+        prefix = prefix.lower()
+        codes = None if kinds is None else {self._codes[kind] for kind in kinds}
+        results = []
+        with self._lock:
+            keys = self._keys
+            position = bisect_left(keys, prefix)
+            while position < len(keys) and len(results) < limit and keys[position].startswith(prefix):
+                code = self._codes_at[position]
+                if codes is None or code in codes:
+                    results.append({"kind": self.kinds[code], "id": self._ids[position], "name": self._names[position]})
+                position += 1
+        return results
+
+    def _find(self, kind, item_id, name):
+        key, code = name.lower(), self._codes[kind]
+        position = bisect_left(self._keys, key)
+        while position < len(self._keys) and self._keys[position] == key:
+            if self._codes_at[position] == code and self._ids[position] == item_id:
+                return position
+            position += 1
+        return None
+
+    def _insert(self, kind, item_id, name):
+        key = name.lower()
+        position = bisect_left(self._keys, key)
+        self._keys.insert(position, key)
+        self._names.insert(position, key if key == name else name)
+        self._codes_at.insert(position, self._codes[kind])
+        self._ids.insert(position, item_id)
+
+    def _merge(self, kind, added):
+        code = self._codes[kind]
+        new = sorted((name.lower(), name, code, item_id) for item_id, name in added)
+        keys, names, codes, ids = [], [], array("B"), array("q")
+        old = zip(self._keys, self._names, self._codes_at, self._ids)
+        for key, name, code, item_id in merge(old, ((key, key if key == name else name, code, item_id) for key, name, code, item_id in new)):
+            keys.append(key)
+            names.append(name)
+            codes.append(code)
+            ids.append(item_id)
+        self._keys, self._names, self._codes_at, self._ids = keys, names, codes, ids
+
+    def _remove(self, kind, item_id, name):
+        position = self._find(kind, item_id, name)
+        if position is not None:
+            del self._keys[position]
+            del self._names[position]
+            del self._codes_at[position]
+            del self._ids[position]
+
+    def apply(self, kind, version, added=(), removed=()):
+        # Cambios de una escritura ya confirmada que dejo la tabla en version.
+        # Solo se aplican si el indice estaba en la version anterior; si no,
+        # otro worker escribio entre medias y toca reconstruir.
+        with self._lock:
+            if not self.ready:
+                return
+            if self.versions.get(kind) != version - 1:
+                self.versions = None
+                return
+            for item_id, name in removed:
+                self._remove(kind, item_id, name)
+            if len(added) > MERGE_THRESHOLD:
+                self._merge(kind, added)
+            else:
+                for item_id, name in added:
+                    self._insert(kind, item_id, name)
+            self.versions[kind] = version
+
+    def invalidate(self):
+        with self._lock:
+            self.versions = None
+
+
+name_index = NameIndex(SEARCH_KINDS)
+_refresh_lock = Lock()
+
+
+def load_rows():
+    for kind, model in SEARCH_KINDS.items():
+        for item_id, name in db.session.execute(db.select(model.id, model.name)):
+            yield kind, item_id, name
+
+
+def refresh_index(index=name_index):
+    # Construye el indice la primera vez y, pasado AUTOCOMPLETE_REFRESH,
+    # comprueba si alguna tabla cambio en otro worker. Solo un thread a la vez.
+    if index.ready and time.monotonic() - index.checked_at < AUTOCOMPLETE_REFRESH:
+        return
+    with _refresh_lock:
+        if index.ready and time.monotonic() - index.checked_at < AUTOCOMPLETE_REFRESH:
+            return
+        versions = get_versions(list(SEARCH_KINDS))
+        if index.ready and versions == index.versions:
+            index.checked_at = time.monotonic()
+            return
+        index.build(load_rows(), versions)
+
+
+def record_change(model, added=(), removed=()):
+    # Para los handlers de escritura, despues del commit: added y removed son
+    # pares (id, name). Sin cambios concretos se reconstruye.
+    kind = model.__tablename__
+    version = g.get("bumped_versions", {}).get(kind)
+    if version is None:
+        # La escritura no cambio nada (p. ej. una carga con todo duplicado)
+        return
+    if not (added or removed):
+        name_index.invalidate()
+        return
+    name_index.apply(kind, version, added, removed)
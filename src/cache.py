@@ -0,0 +1,90 @@
+"""
+In-process caches for data that rarely changes
+"""
+import os
+import time
+from collections import OrderedDict
+from threading import Lock
+
+
+class LRUCache:
+    # LRU acotado con TTL y contadores de aciertos/fallos. Las claves empiezan
+    # por un namespace (el nombre de la tabla) y cada namespace tiene una
+    # generacion: invalidar es subir la generacion, las entradas viejas dejan
+    # de encontrarse y el LRU las acaba expulsando.
+    def __init__(self, maxsize=1024, ttl=60):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._generations = {}
+        self._lock = Lock()
+
+    def _key(self, namespace, key):
+        return (namespace, self._generations.get(namespace, 0), key)
+
+    def get_or_load(self, namespace, key, loader):
+        # loader() devuelve el valor a cachear; None no se guarda
+        with self._lock:
+            full_key = self._key(namespace, key)
+            entry = self._data.get(full_key)
+            if entry is not None and entry[0] > time.monotonic():
+                self._data.move_to_end(full_key)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+        value = loader()
+        if value is not None:
+            with self._lock:
+                # Si se invalido mientras se cargaba, la clave ya es de una
+                # generacion vieja y nadie la volvera a leer
+                self._data[full_key] = (time.monotonic() + self.ttl, value)
+                self._data.move_to_end(full_key)
+                while len(self._data) > self.maxsize:
+                    self._data.popitem(last=False)
+        return value
+
+    def invalidate(self, namespace):
+        with self._lock:
+            self._generations[namespace] = self._generations.get(namespace, 0) + 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / total if total else 0.0,
+        }
+
+
+class NullCache:
+    # Cache desactivada: siempre carga
+    hits = misses = 0
+
+    def get_or_load(self, namespace, key, loader):
+        return loader()
+
+    def invalidate(self, namespace):
+        pass
+
+    def clear(self):
+        pass
+
+    def stats(self):
+        return {"size": 0, "hits": 0, "misses": 0, "hit_ratio": 0.0}
+
+
+# Cache de planets, films, characters y species. Con varios workers cada uno
+# tiene la suya: una escritura solo invalida la del worker que la atiende y
+# los demas pueden servir datos viejos como mucho CATALOGUE_CACHE_TTL segundos.
+CATALOGUE_CACHE_ENABLED = os.getenv("CATALOGUE_CACHE_ENABLED", "1").lower() in ("1", "true", "yes")
+CATALOGUE_CACHE_SIZE = int(os.getenv("CATALOGUE_CACHE_SIZE", 4096))
+CATALOGUE_CACHE_TTL = float(os.getenv("CATALOGUE_CACHE_TTL", 30))
+
+catalogue_cache = LRUCache(CATALOGUE_CACHE_SIZE, CATALOGUE_CACHE_TTL) if CATALOGUE_CACHE_ENABLED else NullCache()
@@ -0,0 +1,18 @@
+"""
+Flask CLI commands for maintenance tasks, run from src/:
+
+    FLASK_APP=app.py flask rebuild-favourites-snapshots
+"""
+import click
+from models import db
+from queries import rebuild_snapshots
+
+
+def setup_commands(app):
+    @app.cli.command("rebuild-favourites-snapshots")
+    def rebuild_favourites_snapshots():
+        # Rehace la copia de favoritos de todos los usuarios desde las tablas
+        # (p. ej. tras editar favoritos o nombres desde /admin)
+        users = rebuild_snapshots()
+        db.session.commit()
+        click.echo(f"Rebuilt the favourites snapshots of {users} users")
@@ -0,0 +1,76 @@
+"""
+Response compression negotiated with Accept-Encoding (gzip, and brotli when
+the `brotli` package is installed)
+"""
+import os
+import gzip
+import hashlib
+from flask import request
+from cache import LRUCache
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+COMPRESS_MIN_SIZE = int(os.getenv("COMPRESS_MIN_SIZE", 500))
+COMPRESS_LEVEL = int(os.getenv("COMPRESS_LEVEL", 6))
+BROTLI_QUALITY = int(os.getenv("BROTLI_QUALITY", 5))
+COMPRESS_CACHE_SIZE = int(os.getenv("COMPRESS_CACHE_SIZE", 256))
+COMPRESS_MIMETYPES = ("application/json", "application/x-ndjson", "text/html", "text/plain")
+
+# Cuerpos ya comprimidos por (ETag, encoding, digest del cuerpo sin comprimir):
+# el digest evita servir un cuerpo viejo si los datos cambian sin que cambie
+# el ETag (p. ej. una escritura que no sube la version). Calcularlo cuesta
+# mucho menos que comprimir.
+compressed_cache = LRUCache(COMPRESS_CACHE_SIZE, ttl=3600)
+
+
+def _compress(data, encoding):
+    if encoding == "br":
+        return brotli.compress(data, quality=BROTLI_QUALITY)
+    return gzip.compress(data, compresslevel=COMPRESS_LEVEL, mtime=0)
+
+
+def choose_encoding(accepted):
+    if brotli is not None and accepted.quality("br") > 0:
+        return "br"
+    if accepted.quality("gzip") > 0:
+        return "gzip"
+    return None
+
+
+def compress_body(data, accepted, etag=None):
+    # Devuelve (cuerpo, encoding), encoding es None si no se comprime
+    encoding = choose_encoding(accepted)
+    if encoding is None or len(data) < COMPRESS_MIN_SIZE:
+        return data, None
+    if etag:
+        key = (etag, encoding, hashlib.blake2b(data, digest_size=16).digest())
+        return compressed_cache.get_or_load("compressed", key, lambda: _compress(data, encoding)), encoding
+    return _compress(data, encoding), encoding
+
+
+def compress_response(response):
+    if (response.status_code != 200
+            or response.direct_passthrough
+            or response.is_streamed
+            or "Content-Encoding" in response.headers
+            or response.mimetype not in COMPRESS_MIMETYPES):
+        return response
+    response.vary.add("Accept-Encoding")
+    etag, weak = response.get_etag()
+    data, encoding = compress_body(response.get_data(), request.accept_encodings, etag)
+    if encoding is None:
+        return response
+    if etag:
+        # Cada codificacion es una representacion distinta: ETag propio
+        response.set_etag(f"{etag}-{encoding}", weak)
+    response.set_data(data)
+    response.headers["Content-Encoding"] = encoding
+    return response
+
+
+def setup_compression(app):
+    app.after_request(compress_response)
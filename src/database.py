@@ -0,0 +1,96 @@
+"""
+SQLAlchemy engine, connection pool and SQLite tuning from environment variables
+"""
+import os
+from sqlalchemy import event
+from models import db
+
+
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", 5))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", 10))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", 30))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", 1800))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "1").lower() in ("1", "true", "yes")
+# Milisegundos, 0 = sin limite (solo PostgreSQL)
+DB_STATEMENT_TIMEOUT = int(os.getenv("DB_STATEMENT_TIMEOUT", 0))
+
+# Las escrituras usan INSERT ... ON CONFLICT y RETURNING (ver queries.py)
+SUPPORTED_DIALECTS = ("postgresql", "sqlite")
+
+SQLITE_BUSY_TIMEOUT = int(os.getenv("SQLITE_BUSY_TIMEOUT", 5000))
+SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", 256 * 1024 * 1024))
+# Negativo = KiB (-65536 son 64 MiB por conexion)
+SQLITE_CACHE_SIZE = int(os.getenv("SQLITE_CACHE_SIZE", -65536))
+
+
+def engine_options(url):
+    if url.startswith("sqlite") and ":memory:" in url:
+        return {}
+    options = {
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_pre_ping": DB_POOL_PRE_PING,
+    }
+    if url.startswith("sqlite"):
+        # sqlite3 espera el timeout en segundos
+        options["connect_args"] = {"timeout": SQLITE_BUSY_TIMEOUT / 1000}
+    elif url.startswith("postgresql") and DB_STATEMENT_TIMEOUT:
+        options["connect_args"] = {"options": f"-c statement_timeout={DB_STATEMENT_TIMEOUT}"}
+    return options
+
+
+def _sqlite_pragmas(dbapi_connection, connection_record):
+    # WAL deja leer mientras otro escribe, NORMAL es seguro con WAL y evita
+    # un fsync por commit, busy_timeout espera al lock en vez de fallar con
+    # "database is locked"
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT}")
+    cursor.execute(f"PRAGMA mmap_size={SQLITE_MMAP_SIZE}")
+    cursor.execute(f"PRAGMA cache_size={SQLITE_CACHE_SIZE}")
+    cursor.close()
+
+
+def dispose_engines(app):
+    # Las conexiones del pool no se pueden compartir entre procesos: tras un
+    # fork el hijo descarta las heredadas (sin cerrarlas, siguen siendo del
+    # padre) y abre las suyas
+    with app.app_context():
+        for engine in db.engines.values():
+            engine.dispose(close=False)
+
+
+def setup_engine(app):
+    with app.app_context():
+        for engine in db.engines.values():
+            if engine.dialect.name not in SUPPORTED_DIALECTS:
+                raise RuntimeError(f"Unsupported database '{engine.dialect.name}': use PostgreSQL or SQLite")
+            if engine.dialect.name == "sqlite":
+                event.listen(engine, "connect", _sqlite_pragmas)
+    if hasattr(os, "register_at_fork"):
+        os.register_at_fork(after_in_child=lambda: dispose_engines(app))
+
+
+def async_database_url(url):
+    # Mismo servidor con el driver async: aiosqlite o asyncpg
+    if url.startswith("sqlite:"):
+        return url.replace("sqlite:", "sqlite+aiosqlite:", 1)
+    if url.startswith("postgresql"):
+        return "postgresql+asyncpg:" + url.split(":", 1)[1]
+    return url
+
+
+def create_async_db_engine(url):
+    from sqlalchemy.ext.asyncio import create_async_engine
+    options = engine_options(url)
+    if url.startswith("postgresql"):
+        options.pop("connect_args", None)
+        if DB_STATEMENT_TIMEOUT:
+            options["connect_args"] = {"server_settings": {"statement_timeout": str(DB_STATEMENT_TIMEOUT)}}
+    engine = create_async_engine(async_database_url(url), **options)
+    if engine.dialect.name == "sqlite":
+        event.listen(engine.sync_engine, "connect", _sqlite_pragmas)
+    return engine
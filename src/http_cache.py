@@ -0,0 +1,56 @@
+"""
+Conditional GET support: strong ETags built from the resource versions
+"""
+import hashlib
+from functools import wraps
+from flask import request, current_app
+from queries import get_versions
+from compression import choose_encoding
+
+
+def etag_for(full_path, accept, versions, keys):
+    # La version de cada recurso mas todo lo que cambia la representacion
+    # (ruta, query string y Accept)
+    raw = "|".join([full_path, str(accept)] + [f"{key}={versions[key]}" for key in keys])
+    return hashlib.sha1(raw.encode()).hexdigest()
+
+
+def compute_etag(keys):
+    return etag_for(request.full_path, request.accept_mimetypes, get_versions(keys), keys)
+
+
+def matching_etag(etag, if_none_match, accept_encodings):
+    # El ETag que envia el cliente puede ser el de la version comprimida
+    # ("<etag>-gzip"), valida mientras no cambie el recurso, pero solo si es
+    # la codificacion que recibiria esta peticion
+    if if_none_match.contains(etag):
+        return etag
+    encoding = choose_encoding(accept_encodings)
+    if encoding and if_none_match.contains(f"{etag}-{encoding}"):
+        return f"{etag}-{encoding}"
+    return None
+
+
+def conditional(keys):
+    # Decorador para vistas GET: si If-None-Match coincide responde 304 sin
+    # ejecutar la vista, si no pone el ETag en las respuestas 200.
+    # keys recibe los argumentos de la ruta y devuelve las claves de version.
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if request.method != "GET":
+                return view(*args, **kwargs)
+            etag = compute_etag(keys(**kwargs))
+            matched = matching_etag(etag, request.if_none_match, request.accept_encodings)
+            if matched:
+                response = current_app.response_class(status=304)
+                response.set_etag(matched)
+                # Como el 200: la representacion depende de Accept-Encoding
+                response.vary.add("Accept-Encoding")
+                return response
+            response = current_app.make_response(view(*args, **kwargs))
+            if response.status_code == 200:
+                response.set_etag(etag)
+            return response
+        return wrapper
+    return decorator
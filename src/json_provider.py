@@ -0,0 +1,67 @@
+"""
+JSON provider that encodes with orjson when it is installed and falls back to
+Flask's default (stdlib json) provider otherwise
+"""
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    # orjson escribe UTF-8 sin escapar; con ensure_ascii = True (en la clase,
+    # la app o la llamada) se usa el encoder de la libreria estandar
+    ensure_ascii = False
+
+    # Fechas y dataclasses se pasan al `default` de Flask para que la salida
+    # sea la misma que con el provider por defecto
+    def _options(self, sort_keys):
+        options = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS
+        if sort_keys:
+            options |= orjson.OPT_SORT_KEYS
+        return options
+
+    def _pretty(self):
+        return (self.compact is None and self._app.debug) or self.compact is False
+
+    def dumps_bytes(self, obj, default=None, sort_keys=None):
+        return orjson.dumps(
+            obj,
+            default=self.default if default is None else default,
+            option=self._options(self.sort_keys if sort_keys is None else sort_keys),
+        )
+
+    def dumps(self, obj, **kwargs):
+        # orjson solo produce salida compacta en UTF-8: ensure_ascii, indent,
+        # otros separators y opciones desconocidas van por la libreria estandar
+        options = dict(kwargs)
+        ensure_ascii = options.pop("ensure_ascii", self.ensure_ascii)
+        sort_keys = options.pop("sort_keys", self.sort_keys)
+        default = options.pop("default", self.default)
+        separators = options.pop("separators", None)
+        if orjson is None or ensure_ascii or options or separators not in (None, (",", ":")):
+            kwargs.setdefault("ensure_ascii", self.ensure_ascii)
+            return super().dumps(obj, **kwargs)
+        try:
+            return self.dumps_bytes(obj, default, sort_keys).decode()
+        except TypeError:
+            # orjson no escribe enteros de mas de 64 bits, la libreria estandar si
+            kwargs.setdefault("ensure_ascii", self.ensure_ascii)
+            return super().dumps(obj, **kwargs)
+
+    def loads(self, s, **kwargs):
+        if orjson is None or kwargs:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        if orjson is None or self.ensure_ascii or self._pretty():
+            return super().response(*args, **kwargs)
+        obj = self._prepare_response_obj(args, kwargs)
+        try:
+            data = self.dumps_bytes(obj)
+        except TypeError:
+            data = super().dumps(obj, ensure_ascii=False).encode()
+        return self._app.response_class(data + b"\n", mimetype=self.mimetype)
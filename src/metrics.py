@@ -0,0 +1,121 @@
+"""
+Prometheus metrics at /metrics (needs the `prometheus_client` package).
+With several gunicorn workers set PROMETHEUS_MULTIPROC_DIR to an empty
+directory: every worker writes its values to mmap'd files there and /metrics
+adds them up, whichever worker answers the scrape.
+"""
+import os
+import time
+from threading import Lock
+from flask import g, request, current_app
+from models import db
+from cache import catalogue_cache
+from compression import compressed_cache
+from query_stats import query_budget
+
+try:
+    from prometheus_client import Counter, Gauge, Histogram, CollectorRegistry, REGISTRY, generate_latest, CONTENT_TYPE_LATEST, multiprocess
+except ImportError:
+    Counter = None
+
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1").lower() in ("1", "true", "yes")
+PROMETHEUS_MULTIPROC_DIR = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+
+CACHES = {"catalogue": catalogue_cache, "compressed": compressed_cache}
+
+if Counter is not None:
+    REQUEST_DURATION = Histogram(
+        "http_request_duration_seconds", "Request latency",
+        ["method", "endpoint", "status"],
+        buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+    )
+    REQUESTS_IN_PROGRESS = Gauge(
+        "http_requests_in_progress", "Requests being served",
+        ["method", "endpoint"], multiprocess_mode="livesum",
+    )
+    DB_STATEMENTS = Histogram(
+        "db_statements_per_request", "SQL statements run by one request",
+        ["endpoint"], buckets=(0, 1, 2, 3, 4, 6, 8, 12, 16, 25, 50, 100),
+    )
+    DB_DURATION = Histogram(
+        "db_duration_per_request_seconds", "Time one request spent running SQL",
+        ["endpoint"], buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1),
+    )
+    POOL_CHECKED_OUT = Gauge("db_pool_checked_out", "Connections in use", multiprocess_mode="livesum")
+    POOL_OVERFLOW = Gauge("db_pool_overflow", "Connections open beyond the pool size", multiprocess_mode="livesum")
+    POOL_SIZE = Gauge("db_pool_size", "Configured pool size", multiprocess_mode="livesum")
+    # Aciertos y fallos de cada cache, el ratio se calcula en Prometheus:
+    # rate(cache_requests_total{result="hit"}) / rate(cache_requests_total)
+    CACHE_REQUESTS = Counter("cache_requests_total", "Cache lookups", ["cache", "result"])
+
+# Ultimos contadores vistos de cada cache, para sumar solo la diferencia
+_cache_seen = {name: (0, 0) for name in CACHES}
+_cache_seen_lock = Lock()
+
+
+def _endpoint():
+    # La regla y no la URL, para no crear una serie por cada id
+    return request.url_rule.rule if request.url_rule else "unmatched"
+
+
+def start_request():
+    g.metrics_start = time.perf_counter()
+    g.metrics_labels = (request.method, _endpoint())
+    REQUESTS_IN_PROGRESS.labels(*g.metrics_labels).inc()
+
+
+def observe_response(response):
+    if "metrics_start" not in g:
+        return response
+    method, endpoint = g.metrics_labels
+    REQUEST_DURATION.labels(method, endpoint, str(response.status_code)).observe(time.perf_counter() - g.metrics_start)
+    stats = g.get("query_stats")
+    if stats is not None:
+        DB_STATEMENTS.labels(endpoint).observe(stats.count)
+        DB_DURATION.labels(endpoint).observe(stats.duration)
+    update_gauges()
+    return response
+
+
+def finish_request(error=None):
+    if "metrics_labels" in g:
+        REQUESTS_IN_PROGRESS.labels(*g.pop("metrics_labels")).dec()
+
+
+def update_gauges():
+    pool = db.engine.pool
+    if hasattr(pool, "checkedout"):
+        POOL_CHECKED_OUT.set(pool.checkedout())
+        POOL_OVERFLOW.set(max(pool.overflow(), 0))
+        POOL_SIZE.set(pool.size())
+    # Con workers gthread dos scrapes a la vez contarian el mismo incremento
+    with _cache_seen_lock:
+        for name, cache in CACHES.items():
+            hits, misses = cache.hits, cache.misses
+            seen_hits, seen_misses = _cache_seen[name]
+            if hits > seen_hits:
+                CACHE_REQUESTS.labels(name, "hit").inc(hits - seen_hits)
+            if misses > seen_misses:
+                CACHE_REQUESTS.labels(name, "miss").inc(misses - seen_misses)
+            _cache_seen[name] = (hits, misses)
+
+
+@query_budget(0)
+def metrics():
+    update_gauges()
+    if PROMETHEUS_MULTIPROC_DIR:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return current_app.response_class(generate_latest(registry), content_type=CONTENT_TYPE_LATEST)
+
+
+def setup_metrics(app):
+    if not METRICS_ENABLED or Counter is None:
+        return
+    app.before_request(start_request)
+    app.after_request(observe_response)
+    app.teardown_request(finish_request)
+    app.add_url_rule("/metrics", "metrics", metrics)
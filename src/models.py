@@ -1,10 +1,25 @@
+from functools import cache
 from flask_sqlalchemy import SQLAlchemy
 
 
 db = SQLAlchemy()
 
 
+@cache
+def row_serializer(model):
+    # Convierte una fila con las columnas de model.serialize_columns (Row o
+    # tupla, en ese orden) en el mismo dict que model.serialize(), sin crear
+    # el objeto ORM
+    columns = model.serialize_columns
+    return lambda row: dict(zip(columns, row))
+
+
+def serialize_select(model):
+    return db.select(*[getattr(model, name) for name in model.serialize_columns])
+
+
 class Users(db.Model):
+    serialize_columns = ("id", "email", "is_active")
     id = db.Column(db.Integer, primary_key=True)
     email = db.Column(db.String(120), unique=True, nullable=False)
     password = db.Column(db.String(80), unique=False, nullable=False)
@@ -22,6 +37,7 @@ class Users(db.Model):
 
 
 class Films(db.Model):
+    serialize_columns = ("id", "name")
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(120), unique=True, nullable=False)
 
@@ -36,6 +52,7 @@ class Films(db.Model):
 
 
 class Characters(db.Model):
+    serialize_columns = ("id", "name")
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(120), unique=True, nullable=False)
 
@@ -50,6 +67,7 @@ class Characters(db.Model):
 
 
 class Planets(db.Model):
+    serialize_columns = ("id", "name")
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(120), unique=True, nullable=False)
 
@@ -64,6 +82,7 @@ class Planets(db.Model):
 
 
 class Species(db.Model):
+    serialize_columns = ("id", "name")
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(120), unique=True, nullable=False)
 
@@ -77,97 +96,63 @@ class Species(db.Model):
         }  
 
 
-class FavouritesFilms(db.Model):
-    id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey("users.id"))
-    user = db.relationship("Users", foreign_keys=[user_id])
-    film_id = db.Column(db.Integer, db.ForeignKey("films.id"))
-    film = db.relationship("Films", foreign_keys=[film_id])
-
-    def __repr__(self):
-        return f'<Favourite: {self.id} - User: {self.user_id} - Film: {self.film_id}>' 
-
-    def serialize(self):
-        return {
-            "user": self.user_id,
-            "film": self.film_id
-        } 
-
-
-class FavouritesPlanets(db.Model):
-    id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey("users.id"))
-    user = db.relationship("Users", foreign_keys=[user_id])
-    planet_id = db.Column(db.Integer, db.ForeignKey("planets.id"))
-    planet = db.relationship("Planets", foreign_keys=[planet_id])
-
-    def __repr__(self):
-        return f'<Favourite: {self.id} - User: {self.user_id} - Planet: {self.planet_id}>' 
-
-    def serialize(self):
-        return {
-            "user": self.user_id,
-            "planet": self.planet_id
-        } 
+class UserFavourites(db.Model):
+    # Los favoritos de todos los tipos en una tabla. El indice unico
+    # (user_id, kind, item_id) cubre la lectura de un usuario: en SQLite lleva
+    # el rowid (id) y en PostgreSQL se incluye id, asi se ordena sin ir a la tabla.
+    # item_id no tiene foreign key (apunta a la tabla de su kind).
+    __table_args__ = (
+        db.Index("ix_user_favourites_user_id_kind_item_id", "user_id", "kind", "item_id", unique=True, postgresql_include=["id"]),
+        db.Index("ix_user_favourites_kind_item_id", "kind", "item_id"),
+        db.CheckConstraint("kind IN ('characters', 'species', 'planets', 'films')", name="ck_user_favourites_kind"),
+    )
+    # Campo de cada tipo en serialize(), el de las antiguas tablas por tipo
+    FIELDS = {"characters": "character", "species": "specie", "planets": "planet", "films": "film"}
 
-
-class FavouritesCharacters(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey("users.id"))
+    user_id = db.Column(db.Integer, db.ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
     user = db.relationship("Users", foreign_keys=[user_id])
-    character_id = db.Column(db.Integer, db.ForeignKey("characters.id"))
-    character = db.relationship("Characters", foreign_keys=[character_id])
+    kind = db.Column(db.String(16), nullable=False)
+    item_id = db.Column(db.Integer, nullable=False)
 
     def __repr__(self):
-        return f'<Favourite: {self.id} - User: {self.user_id} - Character: {self.character_id}>' 
+        return f'<Favourite: {self.id} - User: {self.user_id} - {self.kind}: {self.item_id}>'
 
     def serialize(self):
         return {
             "user": self.user_id,
-            "character": self.character_id
-        }   
+            self.FIELDS[self.kind]: self.item_id
+        }
 
 
-class FavouritesSpecies(db.Model):
-    id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey("users.id"))
-    user = db.relationship("Users", foreign_keys=[user_id])
-    specie_id = db.Column(db.Integer, db.ForeignKey("species.id"))
-    specie = db.relationship("Species", foreign_keys=[specie_id])
+class ResourceVersions(db.Model):
+    # Contador de version por recurso ("planets", "favourites:<user_id>"...),
+    # lo suben los endpoints que escriben y se usa para calcular los ETag
+    key = db.Column(db.String(80), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
 
     def __repr__(self):
-        return f'<Favourite: {self.id} - User: {self.user_id} - Specie: {self.specie_id}>' 
+        return f'<ResourceVersion: {self.key} - {self.version}>'
 
     def serialize(self):
         return {
-            "user": self.user_id,
-            "specie": self.specie_id
-        }   
+            "key": self.key,
+            "version": self.version,
+        }
 
 
-class Favourites(db.Model):
-    id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey("users.id"))
-    user = db.relationship("Users", foreign_keys=[user_id])
-    film_id = db.Column(db.Integer, db.ForeignKey("films.id"))
-    film = db.relationship("Films", foreign_keys=[film_id])
-    planet_id = db.Column(db.Integer, db.ForeignKey("planets.id"))
-    planet = db.relationship("Planets", foreign_keys=[planet_id])
-    specie_id = db.Column(db.Integer, db.ForeignKey("species.id"))
-    specie = db.relationship("Species", foreign_keys=[specie_id])
-    character_id = db.Column(db.Integer, db.ForeignKey("characters.id"))
-    character = db.relationship("Characters", foreign_keys=[character_id])
+class FavouritesSnapshots(db.Model):
+    # Favoritos de cada usuario ya montados ({kind: [{id, name}]}), para leer
+    # GET /users/<id>/favourites con una sola fila. Se actualiza en la misma
+    # transaccion que cada escritura de favoritos y de nombres del catalogo.
+    user_id = db.Column(db.Integer, db.ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    favourites = db.Column(db.JSON, nullable=False)
 
     def __repr__(self):
-        return f'<Favourites {self.id} - {self.user_id} - {self.film_id} - {self.planet_id} - {self.specie_id} - {self.character_id}>'
+        return f'<FavouritesSnapshot: {self.user_id}>'
 
     def serialize(self):
         return {
-            "id": self.id,
-            "user": self.user,
-            "film": self.film,
-            "planet": self.planet,
-            "species": self.specie,
-            "characters": self.character
+            "user_id": self.user_id,
+            "favourites": self.favourites,
         }
-
@@ -0,0 +1,120 @@
+"""
+Wall-clock sampling profiler for live workers. A fraction of the requests
+(PROFILE_SAMPLE_RATE) is sampled: a background thread reads the stack of the
+threads serving them every PROFILE_INTERVAL_MS and counts the stacks per
+endpoint in collapsed format ("frame;frame;frame count"), ready for
+flamegraph.pl or speedscope. Every worker keeps its own profile.
+"""
+import os
+import sys
+import time
+import random
+import threading
+from collections import Counter
+from flask import request
+
+
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", 0))
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", 5))
+# Stacks distintos por endpoint, los que no caben se cuentan como [truncated]
+PROFILE_MAX_STACKS = int(os.getenv("PROFILE_MAX_STACKS", 5000))
+
+
+class SamplingProfiler:
+    def __init__(self, interval, max_stacks):
+        self.interval = interval
+        self.max_stacks = max_stacks
+        self.profiles = {}
+        self.requests = Counter()
+        self._active = {}
+        self._lock = threading.Lock()
+        self._pid = None
+
+    def _ensure_thread(self):
+        # Los threads no sobreviven al fork: cada worker arranca el suyo
+        if self._pid != os.getpid():
+            self._pid = os.getpid()
+            threading.Thread(target=self._run, name="profiler", daemon=True).start()
+
+    def start(self, endpoint):
+        with self._lock:
+            self._ensure_thread()
+            self._active[threading.get_ident()] = endpoint
+            self.requests[endpoint] += 1
+
+    def stop(self):
+        thread_id = threading.get_ident()
+        if thread_id in self._active:
+            with self._lock:
+                self._active.pop(thread_id, None)
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            if self._active:
+                self.sample()
+
+    def sample(self):
+        frames = sys._current_frames()
+        with self._lock:
+            for thread_id, endpoint in self._active.items():
+                frame = frames.get(thread_id)
+                if frame is not None:
+                    self._add(endpoint, collapse(frame))
+
+    def _add(self, endpoint, stack):
+        stacks = self.profiles.setdefault(endpoint, Counter())
+        if stack not in stacks and len(stacks) >= self.max_stacks:
+            stack = "[truncated]"
+        stacks[stack] += 1
+
+    def collapsed(self, endpoint=None):
+        with self._lock:
+            lines = [
+                f"{stack} {count}"
+                for name, stacks in self.profiles.items() if endpoint is None or name == endpoint
+                for stack, count in stacks.items()
+            ]
+        return "\n".join(sorted(lines)) + "\n" if lines else ""
+
+    def summary(self):
+        with self._lock:
+            return [
+                {"endpoint": name, "requests": self.requests[name], "samples": sum(stacks.values())}
+                for name, stacks in sorted(self.profiles.items())
+            ]
+
+    def reset(self):
+        with self._lock:
+            self.profiles.clear()
+            self.requests.clear()
+
+
+def collapse(frame):
+    # De la raiz a la hoja, "funcion (fichero:linea)" separados por ;
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+
+profiler = SamplingProfiler(PROFILE_INTERVAL_MS / 1000, PROFILE_MAX_STACKS)
+
+
+def start_request():
+    if random.random() < PROFILE_SAMPLE_RATE:
+        profiler.start(request.url_rule.rule if request.url_rule else "unmatched")
+
+
+def finish_request(error=None):
+    profiler.stop()
+
+
+def setup_profiler(app):
+    # Desactivado (PROFILE_SAMPLE_RATE=0) no se registra ningun hook
+    if PROFILE_SAMPLE_RATE <= 0:
+        return
+    app.before_request(start_request)
+    app.teardown_request(finish_request)
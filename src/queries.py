@@ -0,0 +1,484 @@
+"""
+Reusable queries for the API endpoints. Writes rely on INSERT ... ON CONFLICT
+and RETURNING, so only PostgreSQL and SQLite are supported.
+"""
+from sqlalchemy.dialects import postgresql, sqlite
+from utils import APIException, BULK_CHUNK_SIZE, MAX_INT64, STREAM_BATCH_SIZE, chunked
+from flask import g
+from cache import catalogue_cache
+from models import db, row_serializer, serialize_select, ResourceVersions, FavouritesSnapshots, UserFavourites, Users, Films, Characters, Species, Planets
+
+
+# Tabla del catalogo de cada tipo de favorito (user_favourites.kind)
+FAVOURITE_KINDS = {
+    "characters": Characters,
+    "species": Species,
+    "planets": Planets,
+    "films": Films,
+}
+
+
+def keyset_page(model, after, limit):
+    # Paginacion por clave (id > after) en vez de OFFSET: el coste es O(page)
+    # en cualquier posicion porque recorre el indice de la primary key.
+    # Se pide una fila de mas para saber si hay pagina siguiente.
+    # Solo se leen las columnas serializadas, como tuplas: sin objetos ORM,
+    # sin identity map y sin columnas que no se envian (password).
+    rows = db.session.execute(keyset_select(model, after, limit)).all()
+    return keyset_result(model, rows, limit)
+
+
+def keyset_select(model, after, limit):
+    return (
+        serialize_select(model)
+        .where(model.id > after)
+        .order_by(model.id)
+        .limit(limit + 1)
+    )
+
+
+def keyset_result(model, rows, limit):
+    serialize_row = row_serializer(model)
+    next_cursor = rows[limit - 1].id if len(rows) > limit else None
+    return [serialize_row(row) for row in rows[:limit]], next_cursor
+
+
+def catalogue_page(model, after, limit):
+    # Si la peticion ya leyo la version de la tabla (ETag) va en la clave: asi
+    # una escritura hecha en otro worker tambien deja fuera la pagina cacheada
+    version = known_version(model.__tablename__)
+    return catalogue_cache.get_or_load(
+        model.__tablename__, ("page", after, limit, version),
+        lambda: keyset_page(model, after, limit),
+    )
+
+
+def get_catalogue_item(model, item_id):
+    # Item serializado o None si no existe (los None no se cachean)
+    def load():
+        item = db.session.get(model, item_id)
+        return item.serialize() if item else None
+    return catalogue_cache.get_or_load(model.__tablename__, ("item", item_id), load)
+
+
+def invalidate_catalogue(model):
+    catalogue_cache.invalidate(model.__tablename__)
+
+
+def favourites_key(user_id):
+    return f"favourites:{user_id}"
+
+
+def get_versions(keys):
+    # Version actual de cada clave (0 si nunca se ha escrito), se guarda en g
+    # para el resto de la peticion
+    versions = versions_result(keys, db.session.execute(versions_select(keys)).all())
+    g.setdefault("resource_versions", {}).update(versions)
+    return versions
+
+
+def versions_select(keys):
+    return db.select(ResourceVersions.key, ResourceVersions.version).where(ResourceVersions.key.in_(keys))
+
+
+def versions_result(keys, rows):
+    versions = {key: 0 for key in keys}
+    versions.update(dict(rows))
+    return versions
+
+
+def dialect_insert(model):
+    # INSERT con on_conflict_do_nothing/on_conflict_do_update del motor en uso
+    if db.session.get_bind().dialect.name == "postgresql":
+        return postgresql.insert(model)
+    return sqlite.insert(model)
+
+
+def known_version(key):
+    return g.get("resource_versions", {}).get(key)
+
+
+def bump_versions(*keys):
+    # Sube la version dentro de la transaccion de la escritura, el commit lo
+    # hace el endpoint. Las versiones nuevas quedan en g.bumped_versions.
+    keys = list(dict.fromkeys(keys))
+    if not keys:
+        return
+    # Todas las claves en un solo INSERT ... ON CONFLICT DO UPDATE
+    g.setdefault("bumped_versions", {}).update(db.session.execute(
+        dialect_insert(ResourceVersions)
+        .values([{"key": key, "version": 1} for key in keys])
+        .on_conflict_do_update(index_elements=["key"], set_={"version": ResourceVersions.version + 1})
+        .returning(ResourceVersions.key, ResourceVersions.version)
+    ).tuples().all())
+
+
+def stream_rows(model, after=0):
+    # yield_per lee por bloques (cursor de servidor en PostgreSQL), la memoria
+    # no depende del tamano de la tabla. Es un generador para que la consulta
+    # se ejecute dentro de stream_with_context y no en la vista
+    serialize_row = row_serializer(model)
+    rows = db.session.execute(
+        serialize_select(model)
+        .where(model.id > after)
+        .order_by(model.id)
+        .execution_options(yield_per=STREAM_BATCH_SIZE)
+    )
+    for row in rows:
+        yield serialize_row(row)
+
+
+def favourite_items(kind, user_id):
+    # Items de un tipo en los favoritos del usuario, ya serializados
+    item = FAVOURITE_KINDS[kind]
+    serialize_row = row_serializer(item)
+    rows = db.session.execute(
+        serialize_select(item)
+        .join(UserFavourites, UserFavourites.item_id == item.id)
+        .where(UserFavourites.user_id == user_id, UserFavourites.kind == kind)
+        .order_by(UserFavourites.id)
+    )
+    return [serialize_row(row) for row in rows]
+
+
+def find_favourite(kind, user_id, item_id):
+    return db.session.execute(
+        db.select(UserFavourites)
+        .where(UserFavourites.user_id == user_id, UserFavourites.kind == kind, UserFavourites.item_id == item_id)
+    ).scalar_one_or_none()
+
+
+# Nombre del item de cada favorito: solo uno de los LEFT JOIN de with_item_names coincide
+FAVOURITE_NAME = db.func.coalesce(*[item.name for item in FAVOURITE_KINDS.values()]).label("name")
+
+
+def with_item_names(statement):
+    # Un LEFT JOIN por clave primaria a la tabla de cada tipo, condicionado al kind
+    for kind, item in FAVOURITE_KINDS.items():
+        statement = statement.outerjoin(item, db.and_(UserFavourites.kind == kind, item.id == UserFavourites.item_id))
+    return statement
+
+
+def _user_favourites_select():
+    # Un recorrido del indice (user_id, kind, item_id) con los nombres de cada
+    # catalogo, y un LEFT JOIN desde users para saber si el usuario existe
+    return (
+        with_item_names(
+            db.select(Users.id.label("user_id"), UserFavourites.kind, UserFavourites.item_id.label("id"), FAVOURITE_NAME)
+            .outerjoin(UserFavourites, UserFavourites.user_id == Users.id)
+        )
+        .where(Users.id == db.bindparam("user_id"))
+        .order_by(UserFavourites.kind, UserFavourites.id)
+    )
+
+
+# Se construye una sola vez, montar la consulta en cada peticion cuesta mas que ejecutarla
+USER_FAVOURITES_SELECT = _user_favourites_select()
+
+
+def user_favourites(user_id):
+    # Devuelve None si el usuario no existe, si no {kind: [items]}
+    rows = db.session.execute(USER_FAVOURITES_SELECT, {"user_id": user_id}).all()
+    return user_favourites_result(rows)
+
+
+def user_favourites_result(rows):
+    if not rows:
+        return None
+    result = {kind: [] for kind in FAVOURITE_KINDS}
+    for row in rows:
+        # Sin favoritos (kind NULL) o con el item ya borrado del catalogo (name NULL)
+        if row.name is not None:
+            result[row.kind].append({"id": row.id, "name": row.name})
+    return result
+
+
+def empty_favourites():
+    return {kind: [] for kind in FAVOURITE_KINDS}
+
+
+SNAPSHOT_SELECT = db.select(FavouritesSnapshots.favourites).where(FavouritesSnapshots.user_id == db.bindparam("user_id"))
+
+
+def read_snapshot(user_id):
+    # {kind: [items]} de la copia del usuario, None si no tiene (usuario
+    # inexistente o sin copia todavia: user_favourites lo resuelve)
+    return db.session.execute(SNAPSHOT_SELECT, {"user_id": user_id}).scalar_one_or_none()
+
+
+def compute_snapshots(user_ids):
+    # Favoritos de varios usuarios con una consulta, desde las tablas de origen
+    result = {user_id: empty_favourites() for user_id in user_ids}
+    rows = db.session.execute(
+        with_item_names(db.select(UserFavourites.user_id, UserFavourites.kind, UserFavourites.item_id, FAVOURITE_NAME))
+        .where(UserFavourites.user_id.in_(user_ids))
+        .order_by(UserFavourites.user_id, UserFavourites.kind, UserFavourites.id)
+    )
+    for row in rows:
+        if row.name is not None:
+            result[row.user_id][row.kind].append({"id": row.item_id, "name": row.name})
+    return result
+
+
+def lock_snapshots(user_ids):
+    # Bloquea las filas de la copia de esos usuarios antes de recalcularlas,
+    # como un SELECT ... FOR UPDATE pero creando tambien las que faltan: el
+    # ON CONFLICT DO UPDATE (que no cambia nada) bloquea la fila existente y
+    # espera a las que otra transaccion acaba de insertar. Asi dos escrituras
+    # a la vez no calculan la copia con los mismos datos y la segunda no pisa
+    # a la primera. En orden de user_id para no crear deadlocks.
+    db.session.execute(
+        dialect_insert(FavouritesSnapshots)
+        .values([{"user_id": user_id, "favourites": empty_favourites()} for user_id in user_ids])
+        .on_conflict_do_update(index_elements=["user_id"], set_={"favourites": FavouritesSnapshots.favourites})
+    )
+
+
+def write_snapshots(snapshots):
+    # snapshots: {user_id: favourites}, UPDATE por clave primaria de filas
+    # ya bloqueadas con lock_snapshots
+    if not snapshots:
+        return
+    db.session.execute(
+        db.update(FavouritesSnapshots),
+        [{"user_id": user_id, "favourites": favourites} for user_id, favourites in snapshots.items()],
+    )
+
+
+def refresh_snapshots(user_ids, chunk_size=BULK_CHUNK_SIZE):
+    # Recalcula por completo la copia de esos usuarios
+    for chunk in chunked(sorted(set(user_ids)), chunk_size):
+        lock_snapshots(chunk)
+        write_snapshots(compute_snapshots(chunk))
+
+
+def update_snapshot(user_id, change):
+    # Cambio incremental: lee la fila bloqueada (FOR UPDATE en PostgreSQL,
+    # SQLite ya serializa las escrituras), aplica change(favourites) y la
+    # guarda. Sin copia previa se calcula entera desde las tablas.
+    favourites = db.session.execute(
+        db.select(FavouritesSnapshots.favourites)
+        .where(FavouritesSnapshots.user_id == user_id)
+        .with_for_update()
+    ).scalar_one_or_none()
+    if favourites is None:
+        refresh_snapshots([user_id])
+        return
+    change(favourites)
+    db.session.execute(
+        db.update(FavouritesSnapshots)
+        .where(FavouritesSnapshots.user_id == user_id)
+        .values(favourites=favourites)
+    )
+
+
+def snapshot_add(user_id, kind, item):
+    update_snapshot(user_id, lambda favourites: favourites.setdefault(kind, []).append(dict(item)))
+
+
+def snapshot_remove(user_id, kind, item_ids):
+    item_ids = set(item_ids)
+
+    def remove(favourites):
+        favourites[kind] = [item for item in favourites.get(kind, []) if item["id"] not in item_ids]
+    update_snapshot(user_id, remove)
+
+
+def refresh_item_snapshots(model, item_id, deleted=False):
+    # Tras cambiar el nombre o borrar un item del catalogo: rehace la copia de
+    # los usuarios que lo tienen en favoritos y cambia su ETag. Si el item se
+    # ha borrado se borran tambien sus favoritos (item_id no tiene foreign key).
+    where = (UserFavourites.kind == model.__tablename__, UserFavourites.item_id == item_id)
+    if deleted:
+        user_ids = list(db.session.execute(
+            db.delete(UserFavourites).where(*where).returning(UserFavourites.user_id)
+        ).scalars())
+    else:
+        user_ids = list(db.session.execute(db.select(UserFavourites.user_id).where(*where)).scalars())
+    refresh_snapshots(user_ids)
+    bump_versions(*[favourites_key(user_id) for user_id in user_ids])
+    return user_ids
+
+
+def create_snapshot(user_id):
+    db.session.execute(db.insert(FavouritesSnapshots).values(user_id=user_id, favourites=empty_favourites()))
+
+
+def delete_user_favourites(user_id):
+    # Al borrar el usuario (SQLite no aplica el ON DELETE CASCADE por defecto)
+    db.session.execute(db.delete(UserFavourites).where(UserFavourites.user_id == user_id))
+    db.session.execute(db.delete(FavouritesSnapshots).where(FavouritesSnapshots.user_id == user_id))
+
+
+def rebuild_snapshots(chunk_size=BULK_CHUNK_SIZE):
+    # Todas las copias desde cero (comando flask rebuild-favourites-snapshots).
+    # Sube tambien la version de los favoritos de cada usuario, en la misma
+    # transaccion: si no, un GET condicional seguiria respondiendo 304 con
+    # los datos de antes. Devuelve cuantos usuarios se han procesado.
+    user_ids = list(db.session.execute(db.select(Users.id).order_by(Users.id)).scalars())
+    for chunk in chunked(user_ids, chunk_size):
+        refresh_snapshots(chunk, chunk_size)
+        bump_versions(*[favourites_key(user_id) for user_id in chunk])
+    return len(user_ids)
+
+
+def insert_ignore(model, index_elements):
+    # INSERT ... ON CONFLICT DO NOTHING
+    return dialect_insert(model).on_conflict_do_nothing(index_elements=index_elements)
+
+
+def _catalogue_names(model, items):
+    max_length = model.name.type.length
+    for position, element in enumerate(items):
+        name = element.get("name") if isinstance(element, dict) else element
+        if not isinstance(name, str) or not name or len(name) > max_length:
+            raise APIException(f"Error: item {position} needs a name of 1 to {max_length} characters", 400)
+        yield name
+
+
+def bulk_insert_names(model, items, chunk_size=BULK_CHUNK_SIZE):
+    # INSERT multi-fila ... ON CONFLICT (name) DO NOTHING por bloques, dentro
+    # de la transaccion de la sesion. Devuelve (pares (id, name) insertados,
+    # ignorados).
+    added = []
+    skipped = 0
+    for names in chunked(_catalogue_names(model, items), chunk_size):
+        rows = list(dict.fromkeys(names))
+        result = db.session.execute(
+            insert_ignore(model, ["name"]).values([{"name": name} for name in rows]).returning(model.id, model.name)
+        ).tuples().all()
+        added += result
+        skipped += len(names) - len(result)
+    if added:
+        bump_versions(model.__tablename__)
+    return added, skipped
+
+
+def parse_item_id(value):
+    # Id de un item del JSON o None: solo enteros (True tambien es int) dentro
+    # de los 64 bits, los float y cadenas no se convierten
+    if isinstance(value, int) and not isinstance(value, bool) and -MAX_INT64 - 1 <= value <= MAX_INT64:
+        return value
+    return None
+
+
+def to_item_id(value, field):
+    item_id = parse_item_id(value)
+    if item_id is None:
+        raise APIException(f"Error: '{field}' must be a 64-bit integer", 400)
+    return item_id
+
+
+def insert_favourite(kind, user_id, item_id):
+    # Un solo INSERT ... SELECT ... ON CONFLICT DO NOTHING RETURNING: el SELECT
+    # sobre el catalogo sustituye a la comprobacion de existencia (item_id no
+    # tiene foreign key) y el indice unico (user_id, kind, item_id) a la
+    # busqueda de duplicados.
+    # Devuelve "added", "duplicate" o "not_found".
+    item = FAVOURITE_KINDS[kind]
+    statement = (
+        insert_ignore(UserFavourites, ["user_id", "kind", "item_id"])
+        .from_select(
+            ["user_id", "kind", "item_id"],
+            db.select(db.literal(user_id, db.Integer), db.literal(kind), item.id).where(item.id == item_id),
+        )
+        .returning(UserFavourites.id)
+    )
+    inserted = db.session.execute(statement).first()
+    if inserted:
+        bump_versions(favourites_key(user_id))
+        # El nombre de la copia sale de la base de datos y no de catalogue_cache
+        # (puede tener segundos de retraso). FOR SHARE en PostgreSQL: un cambio
+        # de nombre en curso espera a esta transaccion y despues rehace esta
+        # copia, o esta lectura espera al cambio y ve el nombre nuevo.
+        row = db.session.execute(
+            serialize_select(item).where(item.id == item_id).with_for_update(read=True)
+        ).one()
+        snapshot_add(user_id, kind, row_serializer(item)(row))
+        return "added"
+    # Solo en el camino de error: distinguir entre item inexistente y duplicado.
+    # Contra la base de datos, no catalogue_cache: la cache puede tener todavia
+    # un item recien borrado (o no tener uno recien creado) en este worker.
+    exists = db.session.execute(db.select(item.id).where(item.id == item_id)).first()
+    return "duplicate" if exists else "not_found"
+
+
+def delete_favourite(kind, user_id, item_id):
+    # Un solo DELETE ... RETURNING en vez de buscar la fila y borrarla.
+    # Devuelve False si el item no estaba en los favoritos del usuario.
+    deleted = db.session.execute(
+        db.delete(UserFavourites)
+        .where(UserFavourites.user_id == user_id, UserFavourites.kind == kind, UserFavourites.item_id == item_id)
+        .returning(UserFavourites.id)
+    ).first()
+    if deleted is None:
+        return False
+    snapshot_remove(user_id, kind, [item_id])
+    bump_versions(favourites_key(user_id))
+    return True
+
+
+def apply_favourites_batch(user_id, operations):
+    # Aplica una lista de {"op": "add"|"remove", "kind", "id"} con un DELETE y
+    # un INSERT para todos los tipos (set-based) dentro de la transaccion, el
+    # commit lo hace el endpoint. Si un mismo item aparece varias veces gana la
+    # ultima operacion. Devuelve un resultado por operacion, en el mismo orden.
+    results = []
+    final = {}
+    for operation in operations:
+        result = dict(operation) if isinstance(operation, dict) else {"operation": operation}
+        results.append(result)
+        op, kind, item_id = result.get("op"), result.get("kind"), result.get("id")
+        item_id = parse_item_id(item_id)
+        if op not in ("add", "remove") or kind not in FAVOURITE_KINDS or item_id is None:
+            result["status"] = "invalid"
+            continue
+        previous = final.get((kind, item_id))
+        if previous is not None:
+            previous["status"] = "superseded"
+        final[(kind, item_id)] = result
+
+    adds = {key: result for key, result in final.items() if result["op"] == "add"}
+    removes = {key: result for key, result in final.items() if result["op"] == "remove"}
+    if removes:
+        removed = set(db.session.execute(
+            db.delete(UserFavourites)
+            .where(UserFavourites.user_id == user_id, db.tuple_(UserFavourites.kind, UserFavourites.item_id).in_(list(removes)))
+            .returning(UserFavourites.kind, UserFavourites.item_id)
+        ).tuples())
+        for key, result in removes.items():
+            result["status"] = "removed" if key in removed else "not_found"
+    if adds:
+        # Un SELECT por tipo sobre su catalogo, todos en el mismo INSERT
+        kinds = {}
+        for kind, item_id in adds:
+            kinds.setdefault(kind, []).append(item_id)
+        candidates = [
+            db.select(db.literal(user_id, db.Integer), db.literal(kind), FAVOURITE_KINDS[kind].id)
+            .where(FAVOURITE_KINDS[kind].id.in_(item_ids), ~db.exists().where(
+                UserFavourites.user_id == user_id, UserFavourites.kind == kind, UserFavourites.item_id == FAVOURITE_KINDS[kind].id
+            ))
+            for kind, item_ids in kinds.items()
+        ]
+        added = set(db.session.execute(
+            insert_ignore(UserFavourites, ["user_id", "kind", "item_id"])
+            .from_select(["user_id", "kind", "item_id"], db.union_all(*candidates))
+            .returning(UserFavourites.kind, UserFavourites.item_id)
+        ).tuples())
+        pending = {}
+        for kind, item_id in adds:
+            if (kind, item_id) not in added:
+                pending.setdefault(kind, []).append(item_id)
+        existing = set(db.session.execute(db.union_all(*[
+            db.select(db.literal(kind).label("kind"), FAVOURITE_KINDS[kind].id).where(FAVOURITE_KINDS[kind].id.in_(item_ids))
+            for kind, item_ids in pending.items()
+        ])).tuples()) if pending else set()
+        for key, result in adds.items():
+            if key in added:
+                result["status"] = "added"
+            else:
+                result["status"] = "duplicate" if key in existing else "not_found"
+    if any(result.get("status") in ("added", "removed") for result in results):
+        bump_versions(favourites_key(user_id))
+        refresh_snapshots([user_id])
+    return results
@@ -0,0 +1,97 @@
+"""
+Per-request SQL statistics: how many statements a request ran and how long
+they took, sent back in the Server-Timing and X-DB-Queries headers, plus
+query budgets per route to catch N+1 regressions
+"""
+import os
+import time
+import logging
+from flask import g, request, current_app, has_request_context
+from sqlalchemy import event
+from models import db
+
+
+QUERY_STATS_ENABLED = os.getenv("QUERY_STATS_ENABLED", "1").lower() in ("1", "true", "yes")
+# Con QUERY_BUDGET_STRICT una ruta que supera su presupuesto lanza
+# QueryBudgetExceeded (falla el test o el benchmark), si no solo se avisa en el log
+QUERY_BUDGET_STRICT = os.getenv("QUERY_BUDGET_STRICT", "0").lower() in ("1", "true", "yes")
+# Presupuesto de las rutas sin @query_budget, 0 = sin limite (@query_budget(0)
+# si es un limite: la ruta no puede ejecutar ninguna sentencia)
+DEFAULT_QUERY_BUDGET = int(os.getenv("DEFAULT_QUERY_BUDGET", 0))
+
+logger = logging.getLogger(__name__)
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+class QueryStats:
+    __slots__ = ("count", "duration")
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+
+
+def query_budget(limit):
+    # Maximo de sentencias SQL de la ruta, se pone debajo de @app.route
+    def decorator(view):
+        view.query_budget = limit
+        return view
+    return decorator
+
+
+def current_stats():
+    # None fuera de una peticion o si las estadisticas estan desactivadas
+    if not has_request_context():
+        return None
+    return g.get("query_stats")
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if current_stats() is not None:
+        conn.info["query_start"] = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stats = current_stats()
+    start = conn.info.pop("query_start", None)
+    if stats is not None and start is not None:
+        stats.count += 1
+        stats.duration += time.perf_counter() - start
+
+
+def start_request():
+    g.query_stats = QueryStats()
+    g.request_start = time.perf_counter()
+
+
+def finish_request(response):
+    stats = g.get("query_stats")
+    if stats is None:
+        return response
+    # Las filas de un stream se leen despues, aqui solo cuenta lo ejecutado hasta ahora
+    total = time.perf_counter() - g.request_start
+    response.headers["X-DB-Queries"] = str(stats.count)
+    response.headers["Server-Timing"] = f'db;dur={stats.duration * 1000:.2f};desc="{stats.count} queries", app;dur={total * 1000:.2f}'
+    view = current_app.view_functions.get(request.endpoint)
+    limit = getattr(view, "query_budget", DEFAULT_QUERY_BUDGET or None)
+    if limit is not None and stats.count > limit:
+        message = f"{request.method} {request.path} ran {stats.count} SQL statements, its budget is {limit}"
+        if current_app.config["QUERY_BUDGET_STRICT"]:
+            raise QueryBudgetExceeded(message)
+        logger.warning(message)
+    return response
+
+
+def setup_query_stats(app):
+    app.config.setdefault("QUERY_BUDGET_STRICT", QUERY_BUDGET_STRICT)
+    if not QUERY_STATS_ENABLED:
+        return
+    with app.app_context():
+        for engine in db.engines.values():
+            event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+            event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+    app.before_request(start_request)
+    app.after_request(finish_request)
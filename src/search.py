@@ -0,0 +1,117 @@
+"""
+Name search over the catalogue (planets, films, characters, species).
+Short queries are case-insensitive prefix matches on the lower(name) index;
+from SEARCH_SUBSTRING_MIN_LENGTH characters on they are substring matches
+through the trigram index. Both are created by the migrations, the trigram
+one is an FTS5 table on SQLite and a pg_trgm GIN index on PostgreSQL.
+Without them they fall back to scans.
+Results are ranked: exact name, then names that start with the query, then
+the rest, shorter names first.
+"""
+from cache import catalogue_cache
+from models import db, row_serializer, serialize_select
+from queries import FAVOURITE_KINDS, known_version
+
+
+# Los trigramas necesitan 3 caracteres, con menos solo se busca por prefijo
+SEARCH_SUBSTRING_MIN_LENGTH = 3
+
+SEARCH_KINDS = dict(FAVOURITE_KINDS)
+
+# lower() de SQLite solo cambia A-Z, el prefijo se pasa a minusculas igual
+SQLITE_LOWER = str.maketrans("ABCDEFGHIJKLMNOPQRSTUVWXYZ", "abcdefghijklmnopqrstuvwxyz")
+
+# Si existe la tabla FTS5 de cada tabla, por engine (se mira una vez)
+_fts_tables = {}
+
+
+def fts_table(model):
+    return f"{model.__tablename__}_name_fts"
+
+
+def has_fts(model):
+    bind = db.session.get_bind()
+    if bind.dialect.name != "sqlite":
+        return False
+    key = (str(bind.url), model.__tablename__)
+    if key not in _fts_tables:
+        _fts_tables[key] = db.session.execute(
+            db.text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"),
+            {"name": fts_table(model)},
+        ).first() is not None
+    return _fts_tables[key]
+
+
+def _escape_like(value):
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def rank(name, q):
+    # El mismo orden que search_select, para mezclar resultados de varias tablas
+    name, q = name.lower(), q.lower()
+    return (0 if name == q else 1 if name.startswith(q) else 2, len(name), name)
+
+
+def search_select(model, q, offset, limit):
+    statement = serialize_select(model)
+    lower_name = db.func.lower(model.name)
+    if len(q) < SEARCH_SUBSTRING_MIN_LENGTH:
+        # Prefijo sobre el indice de lower(name). SQLite solo usa un indice de
+        # expresion con un rango sobre la misma expresion (compara bytes, y
+        # q + max queda detras de todo lo que empieza por q); PostgreSQL con
+        # LIKE 'q%', que el indice text_pattern_ops convierte en un rango
+        if db.session.get_bind().dialect.name == "sqlite":
+            prefix = q.translate(SQLITE_LOWER)
+            statement = statement.where(lower_name >= prefix, lower_name < prefix + "\U0010ffff")
+        else:
+            statement = statement.where(lower_name.like(_escape_like(q.lower()) + "%", escape="\\"))
+    elif has_fts(model):
+        fts = db.table(fts_table(model), db.column("rowid"))
+        phrase = '"' + q.replace('"', '""') + '"'
+        statement = (
+            statement.join(fts, fts.c.rowid == model.id)
+            .where(db.literal_column(f'"{fts_table(model)}"').op("MATCH")(phrase))
+        )
+    else:
+        # PostgreSQL usa aqui el indice de trigramas (gin_trgm_ops)
+        statement = statement.where(model.name.ilike(f"%{_escape_like(q)}%", escape="\\"))
+    relevance = db.case(
+        (lower_name == q.lower(), 0),
+        (lower_name.startswith(q.lower(), autoescape=True), 1),
+        else_=2,
+    )
+    return (
+        statement
+        .order_by(relevance, db.func.length(model.name), model.name)
+        .offset(offset)
+        .limit(limit + 1)
+    )
+
+
+def search_names(model, q, offset, limit):
+    # Una pagina de resultados y el offset de la siguiente (None si no hay)
+    rows = db.session.execute(search_select(model, q, offset, limit)).all()
+    serialize_row = row_serializer(model)
+    next_offset = offset + limit if len(rows) > limit else None
+    return [serialize_row(row) for row in rows[:limit]], next_offset
+
+
+def catalogue_search(model, q, offset, limit):
+    # Cacheada como catalogue_page, con la version de la tabla en la clave
+    version = known_version(model.__tablename__)
+    return catalogue_cache.get_or_load(
+        model.__tablename__, ("search", q, offset, limit, version),
+        lambda: search_names(model, q, offset, limit),
+    )
+
+
+def search_catalogue(q, kinds, offset, limit):
+    # Las primeras offset + limit de cada tabla bastan para la pagina pedida
+    results, more = [], False
+    for kind in kinds:
+        items, next_offset = catalogue_search(SEARCH_KINDS[kind], q, 0, offset + limit)
+        results += [{"kind": kind, **item} for item in items]
+        more = more or next_offset is not None
+    results.sort(key=lambda item: rank(item["name"], q) + (item["kind"],))
+    more = more or len(results) > offset + limit
+    return results[offset:offset + limit], offset + limit if more else None
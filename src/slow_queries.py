@@ -0,0 +1,98 @@
+"""
+Slow-query log: every SQL statement slower than SLOW_QUERY_MS is kept in a
+bounded ring buffer (shown at /admin/slow-queries/) with the route that ran
+it, the query plan from EXPLAIN (PostgreSQL) or EXPLAIN QUERY PLAN (SQLite)
+and, with SLOW_QUERY_LOG_PARAMS, its parameters
+"""
+import os
+import time
+import logging
+from collections import deque
+from datetime import datetime, timezone
+from flask import request, has_request_context
+from sqlalchemy import event
+from models import db
+
+
+# 0 = desactivado (no se registra ningun listener)
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", 0))
+SLOW_QUERY_BUFFER_SIZE = int(os.getenv("SLOW_QUERY_BUFFER_SIZE", 200))
+SLOW_QUERY_EXPLAIN = os.getenv("SLOW_QUERY_EXPLAIN", "1").lower() in ("1", "true", "yes")
+# Desactivado por defecto: los parametros pueden llevar contrasenas o emails
+SLOW_QUERY_LOG_PARAMS = os.getenv("SLOW_QUERY_LOG_PARAMS", "0").lower() in ("1", "true", "yes")
+MAX_TEXT_LENGTH = 2000
+
+EXPLAIN_PREFIXES = {"sqlite": "EXPLAIN QUERY PLAN ", "postgresql": "EXPLAIN "}
+EXPLAINABLE = ("SELECT", "WITH", "INSERT", "UPDATE", "DELETE")
+
+logger = logging.getLogger(__name__)
+
+# Las entradas mas viejas salen solas al llenarse
+slow_queries = deque(maxlen=SLOW_QUERY_BUFFER_SIZE)
+
+
+def _truncate(text):
+    return text if len(text) <= MAX_TEXT_LENGTH else text[:MAX_TEXT_LENGTH] + "..."
+
+
+def explain(conn, statement, parameters):
+    # En un cursor aparte (las filas de la sentencia aun no se han leido del
+    # suyo), dentro de la transaccion en curso y con los mismos parametros.
+    # EXPLAIN sin ANALYZE no vuelve a ejecutar la sentencia.
+    prefix = EXPLAIN_PREFIXES.get(conn.dialect.name)
+    if prefix is None or not statement.lstrip().upper().startswith(EXPLAINABLE):
+        return None
+    postgresql = conn.dialect.name == "postgresql"
+    cursor = conn.connection.cursor()
+    try:
+        # En PostgreSQL un error abortaria la transaccion de la peticion
+        if postgresql:
+            cursor.execute("SAVEPOINT slow_query_explain")
+        cursor.execute(prefix + statement, parameters)
+        plan = [str(row[-1]) for row in cursor.fetchall()]
+        if postgresql:
+            cursor.execute("RELEASE SAVEPOINT slow_query_explain")
+        return plan
+    except Exception as error:
+        if postgresql:
+            cursor.execute("ROLLBACK TO SAVEPOINT slow_query_explain")
+        return [f"EXPLAIN failed: {error}"]
+    finally:
+        cursor.close()
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info["slow_query_start"] = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    start = conn.info.pop("slow_query_start", None)
+    if start is None:
+        return
+    duration = (time.perf_counter() - start) * 1000
+    if duration < SLOW_QUERY_MS:
+        return
+    route = f"{request.method} {request.url_rule.rule if request.url_rule else request.path}" if has_request_context() else None
+    entry = {
+        "time": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "duration_ms": round(duration, 3),
+        "statement": _truncate(statement),
+        "parameters": _truncate(repr(parameters)) if SLOW_QUERY_LOG_PARAMS else None,
+        "route": route,
+        "pid": os.getpid(),
+        "plan": None,
+    }
+    # executemany no tiene un unico plan (y sus parametros son una lista)
+    if SLOW_QUERY_EXPLAIN and not executemany:
+        entry["plan"] = explain(conn, statement, parameters)
+    slow_queries.append(entry)
+    logger.warning("Slow query (%.1f ms) from %s: %s", duration, route or "-", entry["statement"])
+
+
+def setup_slow_queries(app):
+    if SLOW_QUERY_MS <= 0:
+        return
+    with app.app_context():
+        for engine in db.engines.values():
+            event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+            event.listen(engine, "after_cursor_execute", _after_cursor_execute)
@@ -1,4 +1,26 @@
-from flask import jsonify, url_for
+import os
+import json
+from flask import jsonify, url_for, request, current_app, Response, stream_with_context
+from werkzeug.routing import IntegerConverter
+
+
+# Limites de paginacion, el maximo lo impone siempre el servidor
+DEFAULT_PAGE_SIZE = int(os.getenv("DEFAULT_PAGE_SIZE", 100))
+MAX_PAGE_SIZE = int(os.getenv("MAX_PAGE_SIZE", 1000))
+# Las busquedas se paginan con offset, acotado porque cada pagina lee offset + limit filas
+MAX_SEARCH_OFFSET = int(os.getenv("MAX_SEARCH_OFFSET", 10000))
+# Maximo de operaciones por peticion en los endpoints batch
+MAX_BATCH_SIZE = int(os.getenv("MAX_BATCH_SIZE", 1000))
+# Filas por INSERT en las cargas masivas
+BULK_CHUNK_SIZE = int(os.getenv("BULK_CHUNK_SIZE", 500))
+
+# Mayor entero de 64 bits con signo (BIGINT): los ids y parametros enteros no
+# pueden pasar de aqui o la base de datos falla con OverflowError
+MAX_INT64 = 2**63 - 1
+
+NDJSON_MIMETYPES = ("application/x-ndjson", "application/jsonl")
+# Filas que se leen de la base de datos por bloque al hacer streaming
+STREAM_BATCH_SIZE = int(os.getenv("STREAM_BATCH_SIZE", 1000))
 
 
 class APIException(Exception):
@@ -18,6 +40,124 @@ class APIException(Exception):
         return rv
 
 
+class Int64Converter(IntegerConverter):
+    # <int:id> acotado a MAX_INT64: un id mayor es un 404 y no un 500
+    def __init__(self, map, *args, **kwargs):
+        kwargs.setdefault("max", MAX_INT64)
+        super().__init__(map, *args, **kwargs)
+
+
+def get_int_arg(name, default=None, minimum=0, maximum=MAX_INT64, args=None):
+    value = (request.args if args is None else args).get(name)
+    if value is None or value == "":
+        return default
+    try:
+        value = int(value)
+    except ValueError:
+        raise APIException(f"Error: '{name}' must be an integer", 400)
+    if value < minimum:
+        raise APIException(f"Error: '{name}' must be >= {minimum}", 400)
+    if value > maximum:
+        raise APIException(f"Error: '{name}' must be <= {maximum}", 400)
+    return value
+
+
+def get_page_args(args=None):
+    # ?after=<id>&limit=<n>, el limite nunca supera MAX_PAGE_SIZE
+    after = get_int_arg("after", 0, args=args)
+    limit = get_int_arg("limit", DEFAULT_PAGE_SIZE, minimum=1, args=args)
+    return after, min(limit, MAX_PAGE_SIZE)
+
+
+def get_search_args(args=None):
+    # ?q=<texto>&offset=<n>&limit=<n>
+    q = (request.args if args is None else args).get("q", "").strip()
+    if not q:
+        raise APIException("Error: 'q' can not be empty", 400)
+    if len(q) > 120:
+        raise APIException("Error: 'q' can have at most 120 characters", 400)
+    offset = get_int_arg("offset", 0, maximum=MAX_SEARCH_OFFSET, args=args)
+    limit = get_int_arg("limit", DEFAULT_PAGE_SIZE, minimum=1, args=args)
+    return q, offset, min(limit, MAX_PAGE_SIZE)
+
+
+def read_json_items():
+    # Iterador sobre los elementos de un array JSON o de un cuerpo NDJSON (una
+    # linea por elemento, se lee en streaming), o None si el cuerpo es un objeto
+    if request.mimetype in NDJSON_MIMETYPES:
+        return _ndjson_lines(request.stream)
+    data = request.json
+    if isinstance(data, list):
+        return iter(data)
+    return None
+
+
+def _ndjson_lines(stream):
+    for number, line in enumerate(stream, start=1):
+        if not line.strip():
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError:
+            raise APIException(f"Error: line {number} is not valid JSON", 400)
+
+
+def wants_ndjson():
+    best = request.accept_mimetypes.best_match(("application/json",) + NDJSON_MIMETYPES)
+    return best in NDJSON_MIMETYPES
+
+
+def wants_stream():
+    # Accept: application/x-ndjson o ?stream=1
+    return request.args.get("stream") in ("1", "true") or wants_ndjson()
+
+
+def prefer_return():
+    # Valor de return en la cabecera Prefer (RFC 7240), p. ej. "minimal"
+    for preference in request.headers.get("Prefer", "").split(","):
+        name, _, value = preference.split(";")[0].partition("=")
+        if name.strip().lower() == "return":
+            return value.strip().strip('"').lower()
+    return None
+
+
+def wants_minimal():
+    # ?return=minimal o Prefer: return=minimal
+    return request.args.get("return") == "minimal" or prefer_return() == "minimal"
+
+
+def stream_response(rows, message):
+    # Respuesta generada fila a fila (rows da dicts ya serializados): NDJSON si
+    # el cliente lo acepta, si no el mismo JSON que el listado normal
+    # ({"message", "results"}) sin paginar
+    dumps = current_app.json.dumps
+    if wants_ndjson():
+        def generate():
+            for row in rows:
+                yield dumps(row) + "\n"
+        return Response(stream_with_context(generate()), mimetype="application/x-ndjson")
+
+    def generate():
+        yield '{"message": ' + dumps(message) + ', "results": ['
+        separator = ""
+        for row in rows:
+            yield separator + dumps(row)
+            separator = ", "
+        yield '], "next_cursor": null}'
+    return Response(stream_with_context(generate()), mimetype="application/json")
+
+
+def chunked(iterable, size):
+    chunk = []
+    for element in iterable:
+        chunk.append(element)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
 def has_no_empty_params(rule):
     defaults = rule.defaults if rule.defaults is not None else ()
     arguments = rule.arguments if rule.arguments is not None else ()
@@ -1,5 +1,7 @@
 # This file was created to run the application on heroku using gunicorn.
 # Read more about it here: https://devcenter.heroku.com/articles/python-gunicorn
+# Production settings (workers, threads, preload...) live in ../gunicorn.conf.py
+# For the async serving mode use the ASGI entry point in asgi.py instead
 from app import app as application
 
 
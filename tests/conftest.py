@@ -0,0 +1,50 @@
+"""
+The tests run the API on a new temporary SQLite database, migrated and seeded
+with the benchmark helpers, with the query budgets in strict mode
+"""
+from itertools import count
+import pytest
+from benchmarks import use_database
+
+# Tiene que ir antes de importar app, que lee DATABASE_URL al cargar
+use_database()
+
+VOLUMES = {"users": 20, "catalogue": 100, "favourites": 5}
+
+
+@pytest.fixture(scope="session")
+def app():
+    from app import app
+    from models import db
+    from benchmarks.seed import seed
+    # TESTING hace que QueryBudgetExceeded llegue al test en vez de ser un 500
+    app.config.update(TESTING=True, QUERY_BUDGET_STRICT=True)
+    with app.app_context():
+        seed(db, **VOLUMES)
+    return app
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+# Los tests que escriben usan sus propios usuarios e items, asi no cambian lo
+# que esperan los escenarios de test_query_budget.py
+_serial = count(1)
+
+
+@pytest.fixture
+def new_user(client):
+    def create():
+        response = client.post("/users", json={"email": f"test-{next(_serial)}@example.com", "password": "x"})
+        return response.get_json()["result"]["id"]
+    return create
+
+
+@pytest.fixture
+def new_item(client):
+    def create(kind, name=None):
+        response = client.post(f"/{kind}", json={"name": name or f"test-{kind}-{next(_serial)}"})
+        return response.get_json()["result"]["id"]
+    return create
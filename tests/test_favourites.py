@@ -0,0 +1,135 @@
+import pytest
+
+MAX_INT64 = 2**63 - 1
+MISSING = MAX_INT64
+
+
+def favourites(client, user_id):
+    response = client.get(f"/users/{user_id}/favourites")
+    assert response.status_code == 200
+    return response.get_json()["result"]
+
+
+def test_batch_reports_a_status_per_operation(client, new_user, new_item):
+    user_id, film_id, planet_id = new_user(), new_item("films"), new_item("planets")
+    response = client.post(f"/users/{user_id}/favourites/batch", json=[
+        {"op": "add", "kind": "films", "id": film_id},
+        {"op": "add", "kind": "films", "id": film_id},
+        {"op": "remove", "kind": "planets", "id": planet_id},
+        {"op": "add", "kind": "planets", "id": MISSING},
+        {"op": "add", "kind": "starships", "id": 1},
+        {"op": "add", "kind": "films", "id": str(film_id)},
+        {"op": "add", "kind": "films", "id": True},
+        {"op": "move", "kind": "films", "id": film_id},
+        "add",
+    ])
+    assert response.status_code == 200
+    statuses = [result["status"] for result in response.get_json()["results"]]
+    assert statuses == ["superseded", "added", "not_found", "not_found", "invalid", "invalid", "invalid", "invalid", "invalid"]
+
+    response = client.post(f"/users/{user_id}/favourites/batch", json={"operations": [
+        {"op": "add", "kind": "films", "id": film_id},
+        {"op": "add", "kind": "planets", "id": planet_id},
+    ]})
+    assert [result["status"] for result in response.get_json()["results"]] == ["duplicate", "added"]
+    response = client.post(f"/users/{user_id}/favourites/batch", json=[{"op": "remove", "kind": "films", "id": film_id}])
+    assert response.get_json()["results"] == [{"op": "remove", "kind": "films", "id": film_id, "status": "removed"}]
+    assert favourites(client, user_id)["films"] == []
+    assert [item["id"] for item in favourites(client, user_id)["planets"]] == [planet_id]
+
+
+def test_batch_errors(client, new_user):
+    user_id = new_user()
+    response = client.post(f"/users/{user_id}/favourites/batch", json={"operations": "add"})
+    assert response.status_code == 400
+    assert response.get_json() == {"message": "Error: send a list of operations"}
+    response = client.post(f"/users/{MISSING}/favourites/batch", json=[])
+    assert response.status_code == 404
+
+
+def test_snapshot_matches_the_favourites_table(app, client, new_user, new_item):
+    from queries import read_snapshot, user_favourites
+    users = [new_user(), new_user()]
+    films = [new_item("films", f"Snapshot film {n}") for n in range(3)]
+    planet_id = new_item("planets")
+    for user_id in users:
+        for film_id in films:
+            assert client.post(f"/users/{user_id}/favourites/films", json={"film_id": film_id}).status_code == 201
+    client.post(f"/users/{users[0]}/favourites/batch", json=[
+        {"op": "add", "kind": "planets", "id": planet_id},
+        {"op": "remove", "kind": "films", "id": films[0]},
+    ])
+    assert client.delete(f"/users/{users[1]}/favourites/films/{films[1]}").status_code == 200
+    assert client.put(f"/films/{films[2]}", json={"name": "Renamed film"}).status_code == 200
+    assert client.delete(f"/planets/{planet_id}").status_code == 200
+
+    with app.app_context():
+        for user_id in users:
+            snapshot = read_snapshot(user_id)
+            assert snapshot == user_favourites(user_id)
+            assert favourites(client, user_id) == snapshot
+    assert favourites(client, users[0]) == {
+        "characters": [], "planets": [], "species": [],
+        "films": [{"id": films[1], "name": "Snapshot film 1"}, {"id": films[2], "name": "Renamed film"}],
+    }
+    assert favourites(client, users[1])["films"] == [
+        {"id": films[0], "name": "Snapshot film 0"}, {"id": films[2], "name": "Renamed film"},
+    ]
+
+
+def test_add_and_remove_a_favourite(client, new_user, new_item):
+    user_id, film_id = new_user(), new_item("films", "Favourite film")
+    response = client.post(f"/users/{user_id}/favourites/films", json={"film_id": film_id})
+    assert response.status_code == 201
+    assert response.get_json()["result"]["favourite_film"] == {"id": film_id, "name": "Favourite film"}
+    response = client.post(f"/users/{user_id}/favourites/films", json={"film_id": film_id})
+    assert response.status_code == 400
+    assert response.get_json() == {"message": "The film is already in the favourites"}
+    response = client.delete(f"/users/{user_id}/favourites/films/{film_id}", headers={"Prefer": "return=minimal"})
+    assert response.status_code == 200
+    assert response.headers["Preference-Applied"] == "return=minimal"
+    assert response.get_json()["result"] == {"user": user_id, "film": film_id}
+    response = client.delete(f"/users/{user_id}/favourites/films/{film_id}")
+    assert response.status_code == 404
+
+
+def test_adding_an_item_deleted_by_another_worker_is_not_found(app, client, new_user, new_item):
+    # La existencia se comprueba en la base de datos: catalogue_cache de este
+    # worker todavia tiene el item
+    from models import db, Planets
+    from queries import get_catalogue_item
+    user_id, planet_id = new_user(), new_item("planets")
+    with app.app_context():
+        assert get_catalogue_item(Planets, planet_id) is not None
+        db.session.execute(db.delete(Planets).where(Planets.id == planet_id))
+        db.session.commit()
+    response = client.post(f"/users/{user_id}/favourites/planets", json={"planet_id": planet_id})
+    assert response.status_code == 404
+
+
+@pytest.mark.parametrize("method, path, body, status, message", [
+    ("get", f"/users/{MISSING}", None, 404, "User not found"),
+    ("get", f"/users/{MISSING}/favourites", None, 404, "User not found"),
+    ("get", f"/films/{MISSING}", None, 404, "Film not found"),
+    ("get", "/films?after=-1", None, 400, "Error: 'after' must be >= 0"),
+    ("get", f"/films?after={MAX_INT64 + 1}", None, 400, f"Error: 'after' must be <= {MAX_INT64}"),
+    ("get", "/films?after=abc", None, 400, "Error: 'after' must be an integer"),
+    ("get", "/films?limit=0", None, 400, "Error: 'limit' must be >= 1"),
+    ("get", "/search?q=", None, 400, "Error: 'q' can not be empty"),
+    ("post", "/users/1/favourites/films", {}, 400, "Error: insert the Film ID"),
+    ("post", "/users/1/favourites/films", {"film_id": "1"}, 400, "Error: 'film_id' must be a 64-bit integer"),
+    ("post", "/users/1/favourites/films", {"film_id": True}, 400, "Error: 'film_id' must be a 64-bit integer"),
+    ("post", "/users/1/favourites/films", {"film_id": MAX_INT64 + 1}, 400, "Error: 'film_id' must be a 64-bit integer"),
+    ("post", "/users/1/favourites/films", {"film_id": MISSING}, 404, f"Error: film with ID {MISSING} does no exist"),
+    ("post", f"/users/{MISSING}/favourites/films", {"film_id": 1}, 404, "User not found"),
+    ("delete", f"/users/{MISSING}/favourites/films/1", None, 404, "Error: User not found"),
+])
+def test_error_responses(client, method, path, body, status, message):
+    response = getattr(client, method)(path, json=body) if body is not None else getattr(client, method)(path)
+    assert response.status_code == status
+    assert response.get_json() == {"message": message}
+
+
+@pytest.mark.parametrize("path", [f"/users/{MAX_INT64 + 1}", "/users/-1", f"/films/{MAX_INT64 + 1}"])
+def test_ids_outside_int64_do_not_match_a_route(client, path):
+    assert client.get(path).status_code == 404
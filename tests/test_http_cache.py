@@ -0,0 +1,82 @@
+import gzip
+from werkzeug.datastructures import Accept
+from werkzeug.http import parse_etags
+
+
+def test_conditional_get_answers_304_until_the_resource_changes(client, new_user, new_item):
+    user_id, film_ids = new_user(), [new_item("films"), new_item("films")]
+    client.post(f"/users/{user_id}/favourites/films", json={"film_id": film_ids[0]})
+    response = client.get(f"/users/{user_id}/favourites")
+    etag = response.headers["ETag"]
+    assert response.status_code == 200
+
+    response = client.get(f"/users/{user_id}/favourites", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.get_data() == b""
+    assert response.headers["ETag"] == etag
+    assert "Accept-Encoding" in response.headers["Vary"]
+
+    client.post(f"/users/{user_id}/favourites/films", json={"film_id": film_ids[1]})
+    response = client.get(f"/users/{user_id}/favourites", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+    assert [item["id"] for item in response.get_json()["result"]["films"]] == film_ids
+
+
+def test_a_catalogue_write_changes_the_list_etag(client, new_item):
+    etag = client.get("/planets").headers["ETag"]
+    assert client.get("/planets", headers={"If-None-Match": etag}).status_code == 304
+    new_item("planets")
+    assert client.get("/planets", headers={"If-None-Match": etag}).status_code == 200
+
+
+def test_each_query_string_has_its_own_etag(client):
+    assert client.get("/films?limit=5").headers["ETag"] != client.get("/films?limit=6").headers["ETag"]
+
+
+def test_compressed_body_is_the_identity_body(client):
+    identity = client.get("/films?limit=100", headers={"Accept-Encoding": "identity"})
+    compressed = client.get("/films?limit=100", headers={"Accept-Encoding": "gzip"})
+    assert "Content-Encoding" not in identity.headers
+    assert compressed.headers["Content-Encoding"] == "gzip"
+    assert "Accept-Encoding" in compressed.headers["Vary"]
+    assert len(compressed.get_data()) < len(identity.get_data())
+    assert gzip.decompress(compressed.get_data()) == identity.get_data()
+    assert compressed.headers["ETag"] == identity.headers["ETag"][:-1] + '-gzip"'
+
+
+def test_small_bodies_are_not_compressed(client):
+    response = client.get("/films?limit=1", headers={"Accept-Encoding": "gzip"})
+    assert response.status_code == 200
+    assert "Content-Encoding" not in response.headers
+
+
+def test_compressed_etag_only_matches_for_the_same_encoding(client):
+    etag = client.get("/films?limit=100", headers={"Accept-Encoding": "gzip"}).headers["ETag"]
+    response = client.get("/films?limit=100", headers={"Accept-Encoding": "gzip", "If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.headers["ETag"] == etag
+    # Sin gzip el cliente recibiria otra representacion: no vale su ETag
+    response = client.get("/films?limit=100", headers={"Accept-Encoding": "identity", "If-None-Match": etag})
+    assert response.status_code == 200
+    assert "Content-Encoding" not in response.headers
+
+
+def test_matching_etag():
+    from http_cache import matching_etag
+    gzip_only, identity = Accept([("gzip", 1)]), Accept([("identity", 1)])
+    assert matching_etag("abc", parse_etags('"abc"'), identity) == "abc"
+    assert matching_etag("abc", parse_etags('"abc-gzip"'), gzip_only) == "abc-gzip"
+    assert matching_etag("abc", parse_etags('"abc-gzip"'), identity) is None
+    assert matching_etag("abc", parse_etags('"abc-deflate"'), gzip_only) is None
+    assert matching_etag("abc", parse_etags('"other"'), gzip_only) is None
+
+
+def test_compressed_cache_is_keyed_on_the_body():
+    # Mismo ETag con otro cuerpo (una escritura que no subio la version): no
+    # se puede servir el cuerpo comprimido anterior
+    from compression import compress_body
+    accepted = Accept([("gzip", 1)])
+    first, second = b"a" * 1000, b"b" * 1000
+    assert gzip.decompress(compress_body(first, accepted, "same-etag")[0]) == first
+    assert gzip.decompress(compress_body(second, accepted, "same-etag")[0]) == second
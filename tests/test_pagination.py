@@ -0,0 +1,48 @@
+import pytest
+
+
+def walk(client, path, limit):
+    # Sigue next_cursor hasta la ultima pagina, devuelve los ids de cada una
+    pages, after = [], 0
+    while True:
+        response = client.get(f"{path}?after={after}&limit={limit}")
+        assert response.status_code == 200
+        body = response.get_json()
+        pages.append([item["id"] for item in body["results"]])
+        if body["next_cursor"] is None:
+            return pages
+        assert body["next_cursor"] == pages[-1][-1]
+        after = body["next_cursor"]
+
+
+@pytest.mark.parametrize("path, model", [("/films", "Films"), ("/planets", "Planets"), ("/users", "Users")])
+def test_keyset_pages_cover_every_row_once(app, client, path, model):
+    import models
+    table = getattr(models, model)
+    with app.app_context():
+        ids = list(models.db.session.execute(models.db.select(table.id).order_by(table.id)).scalars())
+    pages = walk(client, path, 7)
+    assert [item_id for page in pages for item_id in page] == ids
+    assert all(len(page) == 7 for page in pages[:-1])
+    assert 0 < len(pages[-1]) <= 7
+
+
+def test_last_page_has_no_cursor(client):
+    last = client.get("/films?after=0&limit=1000").get_json()
+    assert last["next_cursor"] is None
+    response = client.get(f"/films?after={last['results'][-1]['id']}")
+    assert response.get_json()["results"] == []
+    assert response.get_json()["next_cursor"] is None
+
+
+def test_exact_page_size_has_no_cursor(client):
+    count = len(client.get("/films?limit=1000").get_json()["results"])
+    assert client.get(f"/films?limit={count}").get_json()["next_cursor"] is None
+    assert client.get(f"/films?limit={count - 1}").get_json()["next_cursor"] is not None
+
+
+def test_limit_is_capped(client):
+    from utils import MAX_PAGE_SIZE
+    response = client.get(f"/users?limit={MAX_PAGE_SIZE + 1}")
+    assert response.status_code == 200
+    assert len(response.get_json()["results"]) <= MAX_PAGE_SIZE
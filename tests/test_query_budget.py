@@ -0,0 +1,63 @@
+import logging
+import pytest
+from benchmarks.endpoints import build_scenarios, not_covered
+from tests.conftest import VOLUMES
+
+SCENARIOS = build_scenarios(VOLUMES)
+# Iteraciones por escenario: las primeras pasan por caminos distintos (cache
+# vacia, ETag nuevo) y cada una usa otro usuario e item
+ITERATIONS = 3
+
+
+def view_for(app, path, method="GET"):
+    adapter = app.url_map.bind("localhost")
+    endpoint, arguments = adapter.match(path, method=method)
+    return app.view_functions[endpoint]
+
+
+def test_strict_mode_raises_when_a_route_exceeds_its_budget(app, client, monkeypatch):
+    from query_stats import QueryBudgetExceeded
+    queries = int(client.get("/users/1/favourites/films").headers["X-DB-Queries"])
+    assert queries > 1
+    monkeypatch.setattr(view_for(app, "/users/1/favourites/films"), "query_budget", queries - 1)
+    with pytest.raises(QueryBudgetExceeded, match=f"ran {queries} SQL statements, its budget is {queries - 1}"):
+        client.get("/users/1/favourites/films")
+
+
+def test_budget_is_only_logged_outside_strict_mode(app, client, monkeypatch, caplog):
+    queries = int(client.get("/users/1/favourites/films").headers["X-DB-Queries"])
+    monkeypatch.setattr(view_for(app, "/users/1/favourites/films"), "query_budget", queries - 1)
+    monkeypatch.setitem(app.config, "QUERY_BUDGET_STRICT", False)
+    with caplog.at_level(logging.WARNING, logger="query_stats"):
+        response = client.get("/users/1/favourites/films")
+    assert response.status_code == 200
+    assert "its budget is" in caplog.text
+
+
+def test_every_route_has_a_budget(app):
+    missing = [
+        rule.rule for rule in app.url_map.iter_rules()
+        if rule.endpoint != "static" and not rule.rule.startswith("/admin")
+        and not hasattr(app.view_functions[rule.endpoint], "query_budget")
+    ]
+    assert missing == []
+
+
+def test_every_route_has_a_scenario(app):
+    assert not_covered(app, SCENARIOS) == []
+
+
+@pytest.mark.parametrize("scenario", SCENARIOS, ids=[item.name for item in SCENARIOS])
+def test_route_stays_within_its_budget(client, scenario):
+    # En modo estricto un exceso lanza QueryBudgetExceeded y falla el test
+    method = scenario.name.split(" ", 1)[0].lower()
+    for i in range(ITERATIONS):
+        context = scenario.setup(client, i) if scenario.setup else None
+        path, kwargs = scenario.build(i, context)
+        response = getattr(client, method)(path, **kwargs)
+        body = response.get_data()
+        assert response.status_code == scenario.status, body
+        if response.status_code == 304:
+            assert body == b""
+        elif response.is_json:
+            assert "message" in response.get_json()